@@ -0,0 +1,306 @@
+import struct   # Struct
+from borsh import schema, types
+
+# class case
+#
+# a single benchmark: a schema, a value to encode and decode with it, and a hand-written baseline
+# that produces and reads the same bytes using the struct module directly. the baseline is the
+# floor that the generic codec is measured against
+class case:
+    name = None
+    schema = None
+    value = None
+    baseline_encode = None
+    baseline_decode = None
+
+    def __init__(self, name: str, schema_def: dict, value: dict, baseline_encode, baseline_decode):
+        self.name = name
+        self.schema = schema(schema_def)
+        self.value = value
+        self.baseline_encode = baseline_encode
+        self.baseline_decode = baseline_decode
+
+_u32 = struct.Struct('<I')
+
+# _primitive_case(name: str, _type: int, format_char: str, value: object) -> case
+#
+# builds the case for a single fixed-width primitive
+def _primitive_case(name: str, _type: int, format_char: str, value: object) -> case:
+    primitive_struct = struct.Struct('<' + format_char)
+    pack = primitive_struct.pack
+    unpack = primitive_struct.unpack
+
+    return case(name, {'value': _type}, {'value': value},
+        lambda value: pack(value['value']),
+        lambda data: {'value': unpack(data)[0]})
+
+# _u128_case(name: str, _type: int, value: int, signed: bool) -> case
+#
+# builds the case for a 128-bit integer, which struct has no format for
+def _u128_case(name: str, _type: int, value: int, signed: bool) -> case:
+    return case(name, {'value': _type}, {'value': value},
+        lambda value: value['value'].to_bytes(16, 'little', signed=signed),
+        lambda data: {'value': int.from_bytes(data, 'little', signed=signed)})
+
+def _string_encode(value):
+    encoded = value['value'].encode('utf-8')
+    return _u32.pack(len(encoded)) + encoded
+
+def _string_decode(data):
+    length = _u32.unpack_from(data)[0]
+    return {'value': bytes(data[4 : 4 + length]).decode('utf-8')}
+
+def _option_encode(value):
+    if value['value'] is None:
+        return b'\0'
+    return b'\1' + struct.pack('<Q', value['value'])
+
+def _option_decode(data):
+    if data[0] == 0:
+        return {'value': None}
+    return {'value': struct.unpack_from('<Q', data, 1)[0]}
+
+_transfer = struct.Struct('<BQ')
+
+def _enum_encode(value):
+    return _transfer.pack(1, value['value'][1])
+
+def _enum_decode(data):
+    tag, amount = _transfer.unpack(data)
+    return {'value': (('Init', 'Transfer', 'Close')[tag], amount)}
+
+_entry = struct.Struct('<II')
+
+def _hashmap_encode(value):
+    out = bytearray(_u32.pack(len(value['value'])))
+    for key in sorted(value['value']):
+        out += _entry.pack(key, value['value'][key])
+    return bytes(out)
+
+def _hashmap_decode(data):
+    length = _u32.unpack_from(data)[0]
+    return {'value': dict(_entry.iter_unpack(data[4 : 4 + length * _entry.size]))}
+
+def _hashset_encode(value):
+    items = sorted(value['value'])
+    return _u32.pack(len(items)) + struct.pack('<' + str(len(items)) + 'Q', *items)
+
+def _hashset_decode(data):
+    length = _u32.unpack_from(data)[0]
+    return {'value': set(struct.unpack_from('<' + str(length) + 'Q', data, 4))}
+
+def _array_encode(value):
+    items = value['value']
+    return _u32.pack(len(items)) + struct.pack('<' + str(len(items)) + 'Q', *items)
+
+def _array_decode(data):
+    length = _u32.unpack_from(data)[0]
+    return {'value': list(struct.unpack_from('<' + str(length) + 'Q', data, 4))}
+
+_point = struct.Struct('<iid')
+
+def _struct_array_encode(value):
+    out = bytearray(_u32.pack(len(value['value'])))
+    for point in value['value']:
+        out += _point.pack(point['x'], point['y'], point['weight'])
+    return bytes(out)
+
+def _struct_array_decode(data):
+    length = _u32.unpack_from(data)[0]
+    return {'value': [{'x': x, 'y': y, 'weight': weight}
+        for x, y, weight in _point.iter_unpack(data[4 : 4 + length * _point.size])]}
+
+_inner = struct.Struct('<QI')
+
+def _nested_encode(value):
+    outer = value['outer']
+    inner = outer['inner']
+    return struct.pack('<B', outer['version']) + _inner.pack(inner['id'], inner['flags']) + \
+        struct.pack('<q', outer['balance'])
+
+def _nested_decode(data):
+    id, flags = _inner.unpack_from(data, 1)
+    return {'outer': {'version': data[0], 'inner': {'id': id, 'flags': flags},
+        'balance': struct.unpack_from('<q', data, 13)[0]}}
+
+# an SPL token account, with Borsh options in place of the C-style options used on chain
+_token_head = struct.Struct('<32s32sQ')
+_token_tail = struct.Struct('<Q')
+
+def _pubkey_option_encode(value):
+    if value is None:
+        return b'\0'
+    return b'\1' + value
+
+def _pubkey_option_decode(data, position):
+    if data[position] == 0:
+        return None, position + 1
+    return bytes(data[position + 1 : position + 33]), position + 33
+
+def _token_encode(value):
+    out = bytearray(_token_head.pack(value['mint'], value['owner'], value['amount']))
+    out += _pubkey_option_encode(value['delegate'])
+    out.append(value['state'])
+    out += b'\0' if value['is_native'] is None else b'\1' + _token_tail.pack(value['is_native'])
+    out += _token_tail.pack(value['delegated_amount'])
+    out += _pubkey_option_encode(value['close_authority'])
+    return bytes(out)
+
+def _token_decode(data):
+    mint, owner, amount = _token_head.unpack_from(data)
+    delegate, position = _pubkey_option_decode(data, _token_head.size)
+    state = data[position]
+    position += 1
+    if data[position] == 0:
+        is_native = None
+        position += 1
+    else:
+        is_native = _token_tail.unpack_from(data, position + 1)[0]
+        position += 9
+    delegated_amount = _token_tail.unpack_from(data, position)[0]
+    close_authority, position = _pubkey_option_decode(data, position + 8)
+
+    return {'mint': mint, 'owner': owner, 'amount': amount, 'delegate': delegate, 'state': state,
+        'is_native': is_native, 'delegated_amount': delegated_amount, 'close_authority': close_authority}
+
+# a Metaplex token metadata account, up to and including the creators
+_creator = struct.Struct('<32sBB')
+
+def _metadata_encode(value):
+    out = bytearray()
+    out.append(value['key'])
+    out += value['update_authority']
+    out += value['mint']
+    for key in ('name', 'symbol', 'uri'):
+        out += _string_encode({'value': value[key]})
+    out += struct.pack('<H', value['seller_fee_basis_points'])
+    creators = value['creators']
+    out += _u32.pack(len(creators))
+    for creator in creators:
+        out += _creator.pack(creator['address'], creator['verified'], creator['share'])
+    out.append(value['primary_sale_happened'])
+    out.append(value['is_mutable'])
+    return bytes(out)
+
+def _metadata_decode(data):
+    result = {'key': data[0], 'update_authority': bytes(data[1:33]), 'mint': bytes(data[33:65])}
+    position = 65
+    for key in ('name', 'symbol', 'uri'):
+        length = _u32.unpack_from(data, position)[0]
+        result[key] = bytes(data[position + 4 : position + 4 + length]).decode('utf-8')
+        position += 4 + length
+    result['seller_fee_basis_points'] = struct.unpack_from('<H', data, position)[0]
+    length = _u32.unpack_from(data, position + 2)[0]
+    position += 6
+    creators = []
+    for n in range(length):
+        address, verified, share = _creator.unpack_from(data, position)
+        creators.append({'address': address, 'verified': verified, 'share': share})
+        position += _creator.size
+    result['creators'] = creators
+    result['primary_sale_happened'] = data[position]
+    result['is_mutable'] = data[position + 1]
+    return result
+
+_pubkey = types.bytes(32)
+
+_token_schema = {
+    'mint': _pubkey,
+    'owner': _pubkey,
+    'amount': types.u64,
+    'delegate': types.option(_pubkey),
+    'state': types.u8,
+    'is_native': types.option(types.u64),
+    'delegated_amount': types.u64,
+    'close_authority': types.option(_pubkey)
+}
+
+_metadata_schema = {
+    'key': types.u8,
+    'update_authority': _pubkey,
+    'mint': _pubkey,
+    'name': types.string,
+    'symbol': types.string,
+    'uri': types.string,
+    'seller_fee_basis_points': types.u16,
+    'creators': types.dynamic_array(types.struct({
+        'address': _pubkey,
+        'verified': types.u8,
+        'share': types.u8
+    })),
+    'primary_sale_happened': types.u8,
+    'is_mutable': types.u8
+}
+
+_point_type = types.struct({'x': types.i32, 'y': types.i32, 'weight': types.f64})
+
+# build_cases() -> list
+#
+# returns every benchmark case. the values are built fresh on every call so that no case can
+# observe changes made to another
+def build_cases() -> list:
+    cases = [
+        _primitive_case('u8', types.u8, 'B', 200),
+        _primitive_case('u16', types.u16, 'H', 60000),
+        _primitive_case('u32', types.u32, 'I', 4000000000),
+        _primitive_case('u64', types.u64, 'Q', 2 ** 63 + 12345),
+        _u128_case('u128', types.u128, 2 ** 100 + 7, False),
+        _primitive_case('i8', types.i8, 'b', -100),
+        _primitive_case('i16', types.i16, 'h', -30000),
+        _primitive_case('i32', types.i32, 'i', -2000000000),
+        _primitive_case('i64', types.i64, 'q', -2 ** 62),
+        _u128_case('i128', types.i128, -2 ** 100, True),
+        _primitive_case('f32', types.f32, 'f', 1.5),
+        _primitive_case('f64', types.f64, 'd', 3.141592653589793),
+
+        case('string', {'value': types.string}, {'value': 'So11111111111111111111111111111111111111112'},
+            _string_encode, _string_decode),
+        case('option_some', {'value': types.option(types.u64)}, {'value': 42}, _option_encode, _option_decode),
+        case('option_none', {'value': types.option(types.u64)}, {'value': None}, _option_encode, _option_decode),
+        case('enum_transfer', {'value': types.enum({'Init': types.u8, 'Transfer': types.u64, 'Close': types.unit})},
+            {'value': ('Transfer', 1000000)}, _enum_encode, _enum_decode),
+        case('hashmap_u32_u32_100', {'value': types.hashmap(types.u32, types.u32)},
+            {'value': {n: n * 3 for n in range(100)}}, _hashmap_encode, _hashmap_decode),
+        case('hashset_u64_100', {'value': types.hashset(types.u64)}, {'value': set(range(0, 1000, 10))},
+            _hashset_encode, _hashset_decode),
+        case('nested_struct', {'outer': types.struct({
+                'version': types.u8,
+                'inner': types.struct({'id': types.u64, 'flags': types.u32}),
+                'balance': types.i64
+            })},
+            {'outer': types.struct({'version': 1, 'inner': types.struct({'id': 99, 'flags': 5}), 'balance': -10})},
+            _nested_encode, _nested_decode),
+        case('dynamic_array_u64_10000', {'value': types.dynamic_array(types.u64)},
+            {'value': list(range(10000))}, _array_encode, _array_decode),
+        case('dynamic_array_struct_1000', {'value': types.dynamic_array(_point_type)},
+            {'value': [types.struct({'x': n, 'y': -n, 'weight': n / 2}) for n in range(1000)]},
+            _struct_array_encode, _struct_array_decode),
+
+        case('spl_token_account', _token_schema, {
+                'mint': bytes(range(32)),
+                'owner': bytes(range(32, 64)),
+                'amount': 1000000000,
+                'delegate': None,
+                'state': 1,
+                'is_native': None,
+                'delegated_amount': 0,
+                'close_authority': bytes(range(64, 96))
+            }, _token_encode, _token_decode),
+        case('metaplex_metadata', _metadata_schema, {
+                'key': 4,
+                'update_authority': bytes(range(32)),
+                'mint': bytes(range(32, 64)),
+                'name': 'Example Collection #1234',
+                'symbol': 'EXMPL',
+                'uri': 'https://arweave.net/2mHDpXQZ1bs8tAuGfjMP3yUtXbBrnVGv1cD9VDUrWj5a',
+                'seller_fee_basis_points': 500,
+                'creators': [
+                    types.struct({'address': bytes(range(64, 96)), 'verified': 1, 'share': 0}),
+                    types.struct({'address': bytes(range(96, 128)), 'verified': 0, 'share': 100})
+                ],
+                'primary_sale_happened': 1,
+                'is_mutable': 1
+            }, _metadata_encode, _metadata_decode)
+    ]
+
+    return cases
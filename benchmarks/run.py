@@ -0,0 +1,133 @@
+import argparse # ArgumentParser
+import json     # dump, load
+import os       # path
+import platform # python_version, machine
+import sys      # exit, path
+import timeit   # Timer
+
+# allow the suite to be run from a checkout without installing the package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import borsh
+from cases import build_cases
+
+# _ops_per_sec(function: function, argument: object, min_time: float, repeat: int) -> float
+#
+# returns the best rate, in calls per second, over 'repeat' timing runs of at least min_time seconds
+def _ops_per_sec(function, argument: object, min_time: float, repeat: int) -> float:
+    timer = timeit.Timer(lambda: function(argument))
+
+    # find a number of calls that takes at least min_time
+    number = 1
+    while True:
+        elapsed = timer.timeit(number)
+        if elapsed >= min_time:
+            break
+        number = max(number * 2, int(number * min_time / max(elapsed, 1e-9)))
+
+    best = min([elapsed] + timer.repeat(repeat - 1, number)) if repeat > 1 else elapsed
+    return number / best
+
+# run_case(case: case, min_time: float, repeat: int) -> dict
+#
+# times decoding and encoding of a single case with borsh and with its struct baseline
+def run_case(case: object, min_time: float, repeat: int) -> dict:
+    encoded = borsh.serialize(case.schema, case.value)
+
+    # the comparison is only fair if both sides do the same work
+    if case.baseline_encode(case.value) != encoded:
+        raise AssertionError('baseline encoding for \'' + case.name + '\' does not match borsh.serialize()')
+
+    _schema = case.schema
+    result = {'size': len(encoded)}
+    for operation, function, argument, baseline, baseline_argument in (
+        ('decode', lambda data: borsh.deserialize(_schema, data), encoded, case.baseline_decode, encoded),
+        ('encode', lambda value: borsh.serialize(_schema, value), case.value, case.baseline_encode, case.value)
+    ):
+        ops = _ops_per_sec(function, argument, min_time, repeat)
+        baseline_ops = _ops_per_sec(baseline, baseline_argument, min_time, repeat)
+        result[operation] = {
+            'ops_per_sec': ops,
+            'bytes_per_sec': ops * len(encoded),
+            'baseline_ops_per_sec': baseline_ops,
+            'relative': ops / baseline_ops
+        }
+
+    return result
+
+# compare(results: dict, previous: dict, threshold: float, metric: str) -> list
+#
+# returns a description of every case and operation whose metric dropped by more than 'threshold'
+# (a fraction) from the previous results. cases missing from either run are ignored
+def compare(results: dict, previous: dict, threshold: float, metric: str) -> list:
+    regressions = []
+    for name, result in results['cases'].items():
+        if name not in previous['cases']:
+            continue
+
+        for operation in ('decode', 'encode'):
+            old = previous['cases'][name][operation][metric]
+            new = result[operation][metric]
+            if new < old * (1 - threshold):
+                regressions.append(name + ' ' + operation + ': ' + metric + ' ' + format(old, '.4g') + ' -> ' +
+                    format(new, '.4g') + ' (' + format((new / old - 1) * 100, '+.1f') + '%)')
+
+    return regressions
+
+def main(argv: list = None) -> int:
+    parser = argparse.ArgumentParser(description='Benchmark borsh.serialize() and borsh.deserialize() against the struct module.')
+    parser.add_argument('--filter', default='', help='only run cases whose name contains this string')
+    parser.add_argument('--min-time', type=float, default=0.1, help='minimum seconds per timing run (default: 0.1)')
+    parser.add_argument('--repeat', type=int, default=3, help='timing runs per measurement, the best is kept (default: 3)')
+    parser.add_argument('--output', help='write the results to this JSON file')
+    parser.add_argument('--compare', help='compare against the results in this JSON file')
+    parser.add_argument('--threshold', type=float, default=0.10,
+        help='fail when a rate drops by more than this fraction of the compared result (default: 0.10)')
+    parser.add_argument('--relative', action='store_true',
+        help='compare rates relative to the struct baseline, which is less sensitive to the machine being used')
+    args = parser.parse_args(argv)
+
+    results = {
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'machine': platform.machine(),
+        'cases': {}
+    }
+
+    print(format('case', '<28') + format('bytes', '>8') + format('op', '>8') + format('ops/sec', '>14') +
+        format('MB/sec', '>10') + format('struct ops/sec', '>16') + format('vs struct', '>11'))
+
+    for case in build_cases():
+        if args.filter not in case.name:
+            continue
+
+        result = run_case(case, args.min_time, args.repeat)
+        results['cases'][case.name] = result
+
+        for operation in ('decode', 'encode'):
+            timing = result[operation]
+            print(format(case.name, '<28') + format(result['size'], '>8') + format(operation, '>8') +
+                format(timing['ops_per_sec'], '>14,.0f') + format(timing['bytes_per_sec'] / 1e6, '>10.1f') +
+                format(timing['baseline_ops_per_sec'], '>16,.0f') + format(timing['relative'], '>10.2f') + 'x')
+
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(results, output, indent=2)
+
+    if args.compare:
+        with open(args.compare) as previous_file:
+            previous = json.load(previous_file)
+
+        regressions = compare(results, previous, args.threshold, 'relative' if args.relative else 'ops_per_sec')
+        if regressions:
+            print('\n' + str(len(regressions)) + ' regression(s) beyond ' + format(args.threshold * 100, '.0f') + '%:')
+            for regression in regressions:
+                print('  ' + regression)
+            return 1
+
+        print('\nno regressions beyond ' + format(args.threshold * 100, '.0f') + '%')
+
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,112 @@
+import argparse             # ArgumentParser
+import concurrent.futures   # ThreadPoolExecutor
+import copy                 # deepcopy
+import os                   # cpu_count, path
+import sys                  # exit, path, _is_gil_enabled
+import time                 # perf_counter
+
+# allow the script to be run from a checkout without installing the package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import borsh
+from cases import build_cases
+
+# _gil_enabled() -> bool
+#
+# returns False only on a free-threaded build of python running with the GIL disabled
+def _gil_enabled() -> bool:
+    is_gil_enabled = getattr(sys, '_is_gil_enabled', None)
+    return True if is_gil_enabled is None else is_gil_enabled()
+
+# _hammer(cases: list, expected: dict, iterations: int) -> int
+#
+# encodes and decodes every case over and over with the schemas shared by all threads, checking
+# every result against the single-threaded one. returns the number of operations done
+def _hammer(cases: list, expected: dict, iterations: int) -> int:
+    operations = 0
+    for n in range(iterations):
+        for case in cases:
+            encoded = borsh.serialize(case.schema, case.value)
+            if encoded != expected[case.name]:
+                raise AssertionError('\'' + case.name + '\' encoded differently on a worker thread')
+            elif borsh.serialize(case.schema, borsh.deserialize(case.schema, encoded)) != encoded:
+                raise AssertionError('\'' + case.name + '\' did not round trip on a worker thread')
+
+            operations += 2
+
+    return operations
+
+# stress(threads: int, iterations: int) -> float
+#
+# runs _hammer() on the specified number of threads at once and returns the operations per second.
+# raises an AssertionError if any result differs from the single-threaded one, or if encoding
+# changed the shared schemas or values
+def stress(threads: int, iterations: int) -> float:
+    cases = build_cases()
+    expected = {case.name: borsh.serialize(case.schema, case.value) for case in cases}
+    schema_defs = {case.name: dict(case.schema._inner_dict) for case in cases}
+    values = {case.name: copy.deepcopy(case.value) for case in cases}
+
+    start = time.perf_counter()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=threads) as executor:
+        futures = [executor.submit(_hammer, cases, expected, iterations) for n in range(threads)]
+        operations = sum(future.result() for future in futures)
+    elapsed = time.perf_counter() - start
+
+    for case in cases:
+        if case.schema._inner_dict != schema_defs[case.name]:
+            raise AssertionError('the schema of \'' + case.name + '\' was changed while encoding')
+        elif case.value != values[case.name]:
+            raise AssertionError('the value of \'' + case.name + '\' was changed while encoding')
+
+    return operations / elapsed
+
+# stress_shared_state(threads: int, iterations: int) -> None
+#
+# hammers the state that is shared between threads at run time rather than compiled up front: a
+# string intern table, a CachedDecoder and serialize_many() on a thread pool
+def stress_shared_state(threads: int, iterations: int) -> None:
+    _schema = borsh.schema({'symbol': borsh.types.string, 'price': borsh.types.u64}, intern_strings=8)
+    items = [{'symbol': 'SYM' + str(n % 32), 'price': n} for n in range(iterations)]
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=threads) as executor:
+        encoded = borsh.serialize_many(_schema, items, executor=executor)
+        if encoded != [borsh.serialize(_schema, item) for item in items]:
+            raise AssertionError('serialize_many() on a thread pool did not match serialize()')
+
+        decoder = borsh.CachedDecoder(_schema, maxsize=16, max_bytes=256)
+        decoded = list(executor.map(decoder, encoded))
+        if decoded != items:
+            raise AssertionError('a shared CachedDecoder returned the wrong values')
+        elif len(decoder) > 16 or decoder.nbytes > 256 or decoder.nbytes != sum(len(key) for key in decoder._values):
+            raise AssertionError('a shared CachedDecoder went past its bounds: ' + str(decoder.stats()))
+
+        decoded = list(executor.map(lambda data: borsh.deserialize(_schema, data), encoded))
+        if decoded != items:
+            raise AssertionError('decoding with a shared string table returned the wrong values')
+
+def main(argv: list = None) -> int:
+    parser = argparse.ArgumentParser(description='Check that schemas can be shared between threads, and how encoding and decoding scale across them.')
+    parser.add_argument('--threads', type=int, default=os.cpu_count() or 1, help='the most threads to run at once (default: the number of CPUs)')
+    parser.add_argument('--iterations', type=int, default=200, help='passes over every case per thread (default: 200)')
+    args = parser.parse_args(argv)
+
+    print('python ' + sys.version.split()[0] + ', GIL ' + ('enabled' if _gil_enabled() else 'disabled'))
+
+    stress_shared_state(args.threads, args.iterations * 50)
+
+    single = None
+    threads = 1
+    while True:
+        rate = stress(threads, args.iterations)
+        single = rate if single is None else single
+        print(format(threads, '>3') + ' thread(s)' + format(rate, '>14,.0f') + ' ops/sec' + format(rate / single, '>8.2f') + 'x')
+
+        if threads >= args.threads:
+            break
+        threads = min(threads * 2, args.threads)
+
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,14 +1,32 @@
-import struct   # unpack
-from .types import types, type_groups
+import array    # array
+import hashlib  # new
+import os       # cpu_count
+import struct   # error
+from .types import types, type_groups, _is_type
+from .compiler import codec, record, variant, numpy, _array_typecode, _min_size
+from .stats import stats, profile, _instrumented_codec
 
 class schema:
     _inner_dict = None
+    _codec = None
+    _use_numpy = False
+    _intern_strings = 0
+    _max_collection_len = None
+    _max_total_bytes = None
+    _stats = None
+    _record_name = 'Record'
 
     def __getitem__(self, index):
         return self._inner_dict[index]
 
-    # initializes a new borsh schema object
-    def __init__(self, schema_def: dict) -> None:
+    # initializes a new borsh schema object. when use_numpy is set, numeric fixed and dynamic
+    # arrays are decoded into numpy arrays that view the source buffer instead of lists. when
+    # intern_strings is set, up to that many short strings are kept and shared between decoded
+    # values, so that repeated strings such as symbols or names are only stored once. for input
+    # that cannot be trusted, max_collection_len caps the number of items in any dynamic array,
+    # hashmap or hashset, and max_total_bytes caps the number of bytes that a record may span
+    def __init__(self, schema_def: dict, use_numpy: bool = False, intern_strings: int = 0,
+        max_collection_len: int = None, max_total_bytes: int = None) -> None:
         # ensure the user gave us a dict
         if not isinstance(schema_def, dict):
             # if not, raise an error containing the class names of this instance
@@ -33,488 +51,614 @@ class schema:
                 key_class_name = key.__class__.__name__
                 raise TypeError('invalid key type \'' + str(key_class_name) + '\' in schema dict')
 
-            # check that the value is a Borsh type
-            if not schema_def[key] in vars(types).values():
-                # check for a constructible type
-                constructible_types = [
-                    types.dynamic_array,
-                    types.fixed_array,
-                    types.hashmap,
-                    types.hashset,
-                    types.option,
-                    types.struct
-                ]
-                if not schema_def[key].__class__ in constructible_types:
-                    raise TypeError('value \'' + str(schema_def[key]) + '\' is not a valid Borsh type')
+            # check that the value is a Borsh type, including the keys of any structs inside it
+            if not _is_type(schema_def[key]):
+                raise TypeError('value \'' + str(schema_def[key]) + '\' is not a valid Borsh type')
+            _check_nested(schema_def[key])
 
             # if the key/value pair is valid, insert it
             self._inner_dict[key] = schema_def[key]
+
+        if not isinstance(intern_strings, int) or intern_strings < 0:
+            raise ValueError('invalid intern_strings \'' + str(intern_strings) + '\' (expected a number of strings)')
+
+        for name, limit in (('max_collection_len', max_collection_len), ('max_total_bytes', max_total_bytes)):
+            if limit is not None and (not isinstance(limit, int) or limit < 0):
+                raise ValueError('invalid ' + name + ' \'' + str(limit) + '\' (expected a non-negative int or None)')
+
+        self._use_numpy = use_numpy
+        self._intern_strings = intern_strings
+        self._max_collection_len = max_collection_len
+        self._max_total_bytes = max_total_bytes
     
+    # compile() -> codec
+    #
+    # walks the type tree once and builds a specialized decoder and encoder for every key in
+    # the schema. the result is cached, so this is called automatically on first use
+    def compile(self) -> codec:
+        if self._codec is None and self._stats is not None:
+            self._codec = _instrumented_codec(self._inner_dict, self._stats, self._use_numpy, self._intern_strings,
+                self._max_collection_len, self._max_total_bytes)
+        elif self._codec is None:
+            self._codec = _interned_codec(self._inner_dict, self._use_numpy, self._intern_strings,
+                self._max_collection_len, self._max_total_bytes)
+
+        return self._codec
+
+    # record_class(name: str = None) -> class
+    #
+    # returns the record class that 'deserialize(..., as_record=True)' decodes into: a tuple
+    # subclass with one attribute per key, in schema order, which takes far less memory than a
+    # dict. structs inside the schema get record classes of their own, named after their keys.
+    # if a name is given, it is used for the class from then on
+    def record_class(self, name: str = None) -> type:
+        if name is not None:
+            if not isinstance(name, str) or not name.isidentifier():
+                raise ValueError('invalid record class name \'' + str(name) + '\'')
+
+            self._record_name = name
+
+        return self.compile().record_decoder(self._record_name).record_class
+
+    # enable_stats(_stats: stats = None) -> stats
+    #
+    # switches this schema to an instrumented codec that records call counts, bytes and time for
+    # every key path into a stats object, which is created if one is not given, and returns it.
+    # the schema's usual codec is untouched, so schemas without stats enabled pay nothing
+    def enable_stats(self, _stats: stats = None) -> stats:
+        self._stats = _stats if _stats is not None else stats()
+        self._codec = None
+
+        return self._stats
+
+    # disable_stats() -> None
+    #
+    # switches this schema back to its uninstrumented codec
+    def disable_stats(self) -> None:
+        if self._stats is not None:
+            self._stats = None
+            self._codec = None
+
+    # the number of bytes that every value of this schema encodes to, or None if it depends on
+    # the value
+    @property
+    def fixed_size(self) -> int:
+        return self.compile().fixed_size
+
+    # the smallest number of bytes that a value of this schema can encode to
+    @property
+    def min_size(self) -> int:
+        return self.compile().min_size
+
+    # the largest number of bytes that a value of this schema can encode to, or None if there is
+    # no upper bound
+    @property
+    def max_size(self) -> int:
+        return self.compile().max_size
+
+    # the compiled codec is made of closures, so it is left out when pickling and rebuilt on first
+    # use after unpickling
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state.pop('_codec', None)
+        return state
+
     def __iter__(self):
         return self._inner_dict.__iter__()
 
     def __next__(self):
         return self._inner_dict.__next__()
 
-# deserialize(schema: schema, data: bytes) -> dict
+# _check_nested(_type: object) -> None
 #
-# deserializes the specified Borsh data into a new dict
-def deserialize(schema: schema, data: bytes) -> dict:
-    results = {}
+# validates the structs nested anywhere inside a type. the constructors of the other types check
+# their own arguments, but struct dicts are only checked here, once, when a schema is defined.
+# collections of items that encode to zero bytes are refused, as they are by Rust's Borsh: a length
+# prefix alone could make the decoder build billions of items without reading any more data
+def _check_nested(_type: object) -> None:
+    if isinstance(_type, (types.dynamic_array, types.hashset, types.hashmap)):
+        if isinstance(_type, types.hashmap):
+            item_size = _min_size(_type.hashmap_key_type) + _min_size(_type.hashmap_value_type)
+        else:
+            item_size = _min_size(_type.array_type if isinstance(_type, types.dynamic_array) else _type.hashset_type)
 
-    # initialize a position in the buffer
-    position = 0
+        if item_size == 0:
+            raise TypeError('collections of zero-sized types are not allowed (\'' + str(_type) + '\')')
 
+    if isinstance(_type, types.struct):
+        for key in _type.struct_dict:
+            if not isinstance(key, str):
+                raise TypeError('invalid key type \'' + str(key.__class__.__name__) + '\' in struct dict')
+            elif not _is_type(_type.struct_dict[key]):
+                raise TypeError('value \'' + str(_type.struct_dict[key]) + '\' is not a valid Borsh type')
+
+            _check_nested(_type.struct_dict[key])
+    elif isinstance(_type, types.enum):
+        for name, payload in _type.variants:
+            _check_nested(payload)
+    elif hasattr(_type, '_values'):
+        for value in _type._values():
+            if _is_type(value):
+                _check_nested(value)
+
+# compiled codecs, shared between every schema with an identical definition. type descriptors are
+# hashable, so the definition itself is the key. the cache is cleared if it grows past
+# _max_interned_codecs, which only happens when definitions are being generated on the fly
+_interned_codecs = {}
+_max_interned_codecs = 1024
+
+# _interned_codec(schema_def: dict, use_numpy: bool, intern_strings: int = 0, ...) -> codec
+#
+# returns the shared codec for a schema definition and options, compiling it the first time it is
+# seen
+def _interned_codec(schema_def: dict, use_numpy: bool, intern_strings: int = 0, max_collection_len: int = None,
+    max_total_bytes: int = None) -> codec:
+    cache_key = (tuple(schema_def.items()), use_numpy, intern_strings, max_collection_len, max_total_bytes)
+    _codec = _interned_codecs.get(cache_key)
+    if _codec is None:
+        if len(_interned_codecs) >= _max_interned_codecs:
+            _interned_codecs.clear()
+
+        # threads compiling the same definition at once all end up sharing the first codec stored
+        _codec = _interned_codecs.setdefault(cache_key, codec(schema_def, use_numpy, intern_strings,
+            max_collection_len, max_total_bytes))
+
+    return _codec
+
+# _get_codec(_schema: object) -> codec
+#
+# returns the compiled codec for a schema, or the codec itself if one is passed. plain dicts are
+# accepted as schemas for convenience. they are validated the first time they are seen and then
+# share the interned codec of any identical definition
+def _get_codec(_schema: object) -> codec:
+    if isinstance(_schema, codec):
+        return _schema
+    elif isinstance(_schema, schema):
+        return _schema.compile()
+    elif isinstance(_schema, dict):
+        try:
+            _codec = _interned_codecs.get((tuple(_schema.items()), False, 0, None, None))
+        except TypeError:
+            # unhashable values are never valid types, so let schema() report the error
+            _codec = None
+
+        if _codec is not None:
+            return _codec
+
+    return schema(_schema).compile()
+
+# deserialize(schema: schema, data: bytes, fields: list = None, as_record: bool = False) -> dict
+#
+# deserializes the specified Borsh data into a new dict. if a list of fields is given, only those
+# keys are decoded. fields may use dotted paths, such as 'config.fee_bps', to select keys inside a
+# struct. every other key is skipped over without being decoded, and decoding stops as soon as the
+# last selected key has been read. when as_record is set, the data is decoded into an instance of
+# the schema's record class instead (see 'schema.record_class()')
+def deserialize(schema: schema, data: bytes, fields: list = None, as_record: bool = False) -> dict:
     # give the user a nice error if they accidentally passed the wrong data type
     if not isinstance(data, bytes):
         raise TypeError('deserialize() expects data to be \'bytes\', not \'' + str(data.__class__.__name__) + '\'')
 
-    # loop over all of the keys in the schema. catch an index error when there
+    if as_record:
+        if fields is not None:
+            raise ValueError('fields cannot be combined with as_record=True')
+
+        return _record_at(schema, data, 0)[0]
+
+    if fields is not None:
+        return _project_at(schema, data, 0, fields, False)[0]
+
+    # return the deserialized results
+    return _deserialize_at(schema, data, 0)[0]
+
+# deserialize_from(schema: schema, buffer: object, offset: int = 0, fields: list = None, as_record: bool = False) -> (dict, int)
+#
+# deserializes a single value from any object supporting the buffer protocol (bytes, bytearray,
+# memoryview, mmap, ...) starting at the specified offset. the buffer is not copied; only the
+# values that are decoded into bytes or strings are. returns the value along with the offset
+# just past it, so that many concatenated records can be walked without slicing. fields and
+# as_record work as they do for deserialize(), except that the rest of the record is always
+# skipped so that the returned offset is correct
+def deserialize_from(schema: schema, buffer: object, offset: int = 0, fields: list = None,
+    as_record: bool = False) -> (dict, int):
+    if not isinstance(offset, int) or offset < 0:
+        raise ValueError('invalid offset \'' + str(offset) + '\' for deserialize_from()')
+
+    if as_record:
+        if fields is not None:
+            raise ValueError('fields cannot be combined with as_record=True')
+
+        return _record_at(schema, _as_buffer(buffer, 'deserialize_from'), offset)
+
+    if fields is not None:
+        return _project_at(schema, _as_buffer(buffer, 'deserialize_from'), offset, fields, True)
+
+    return _deserialize_at(schema, _as_buffer(buffer, 'deserialize_from'), offset)
+
+# deserialize_many(schema: schema, buffers: iterable, columnar: bool = False) -> object
+#
+# deserializes a batch of records, one per buffer. by default a list of dicts is returned. when
+# columnar is set, a single dict is returned instead, holding one column per schema key. columns
+# of primitive numeric keys are array.array objects (numpy arrays for schemas created with
+# use_numpy=True) and all other columns are lists
+def deserialize_many(schema: schema, buffers: object, columnar: bool = False) -> object:
+    _codec = _get_codec(schema)
+
+    if not columnar:
+        return [_deserialize_at(_codec, _as_buffer(buffer, 'deserialize_many'), 0)[0] for buffer in buffers]
+
+    # records with a fixed layout that numpy understands are decoded with one vectorized call
+    if _codec.record_dtype is not None:
+        joined = _join_records(buffers, _codec.record_dtype.itemsize)
+        records = numpy.frombuffer(joined, _codec.record_dtype)
+
+        return {key: records[key] for key in _codec.column_formats}
+
+    # records made up only of primitives are decoded with a single struct and then transposed
+    if _codec.record_struct is not None:
+        joined = _join_records(buffers, _codec.record_struct.size)
+        rows = _codec.record_struct.iter_unpack(joined)
+        columns = dict(zip(_codec.column_formats, zip(*rows)))
+    else:
+        columns = {key: [] for key in _codec.column_formats}
+        for buffer in buffers:
+            record = _deserialize_at(_codec, _as_buffer(buffer, 'deserialize_many'), 0)[0]
+            for key in columns:
+                columns[key].append(record[key])
+
+    # convert the numeric columns into compact arrays
+    for key, format_char in _codec.column_formats.items():
+        values = columns.get(key, ())
+        if format_char is None:
+            columns[key] = list(values)
+        elif _codec.use_numpy:
+            columns[key] = numpy.array(values, dtype='<' + format_char)
+        else:
+            columns[key] = array.array(_array_typecode(format_char), values)
+
+    return columns
+
+# _as_buffer(buffer: object, function_name: str) -> object
+#
+# returns bytes objects unchanged and views anything else supporting the buffer protocol as a flat
+# memoryview of unsigned bytes, without copying it
+def _as_buffer(buffer: object, function_name: str) -> object:
+    if isinstance(buffer, bytes):
+        return buffer
+
+    try:
+        buffer = memoryview(buffer)
+    except TypeError:
+        raise TypeError(function_name + '() expects an object supporting the buffer protocol, not \'' +
+            str(buffer.__class__.__name__) + '\'')
+
+    if buffer.format != 'B' or buffer.ndim != 1:
+        buffer = buffer.cast('B')
+
+    return buffer
+
+# _join_records(buffers: iterable, record_size: int) -> bytes
+#
+# concatenates the first record_size bytes of every buffer into one contiguous block
+def _join_records(buffers: object, record_size: int) -> bytes:
+    joined = bytearray()
+    for n, buffer in enumerate(buffers):
+        buffer = _as_buffer(buffer, 'deserialize_many')
+        if len(buffer) < record_size:
+            raise IndexError('out of data while reading record ' + str(n))
+
+        joined += buffer[:record_size]
+
+    return bytes(joined)
+
+# _deserialize_at(_schema: schema, data: object, position: int) -> (dict, int)
+#
+# internal method for deserializing a dict from the specified position in a bytes object or a
+# flat memoryview. not intended to be called by user code; use deserialize() or deserialize_from()
+def _deserialize_at(_schema: schema, data: object, position: int) -> (dict, int):
+    results = {}
+    _codec = _get_codec(_schema)
+    if _codec.max_total_bytes is not None and len(data) - position > _codec.max_total_bytes:
+        return _limited_at(_deserialize_at, _codec, _codec, data, position)
+
+    # loop over all of the compiled decoders in the schema. catch an error when there
     # is not enough data for the specified schema
     try:
         key = None
-        for key in schema:
-            results, position = _deserialize_single(
-                key,
-                schema,
-                schema[key],
-                data,
-                position,
-                results
-            )
-    except IndexError as ie:
+        for key, run_keys, decode_value in _codec.decoders:
+            if run_keys is None:
+                results[key], position = decode_value(data, position)
+            else:
+                values, position = decode_value(data, position)
+                results.update(zip(run_keys, values))
+    except (IndexError, struct.error) as ie:
         raise IndexError('out of data while reading value for key \'' + str(key) + '\'')
 
-    # return the deserialized results
-    return results
+    return results, position
 
-# _deserialize_single(key: object, _type: object, data: bytes, position: int, results: dict) -> (dict, int)
+# _record_at(_schema: schema, data: object, position: int) -> (record, int)
 #
-# internal method for deserializing a single Borsh object. not intended to be called by user code; use
-# the deserialize() method instead
-def _deserialize_single(key: object, _schema: schema, _type: object, data: bytes, position: int, results: dict) -> (dict, int):
-    # determine what data type it is and perform the correct behavior
-    # first, check for a uint type
-    if _type in type_groups.uint_types:
-        # determine the number of bytes to get
-        byte_width = _type
-
-        # get the correct number of bytes, shifting left each time
-        # to conform with the little endian format of Borsh
-        result = 0
-        for n in range(byte_width):
-            result <<= 8
-            result += data[position + (byte_width - (n + 1))]
-
-        # store the result
-        results[key] = result
-        position += byte_width
-    # then, check for a signed int type
-    elif _type in type_groups.int_types:
-        # determine the number of bytes to get
-        byte_width = _type - type_groups.signed_int_offset
-
-        # get the correct number of bytes, shifting left each time
-        # to conform with the little endian format of Borsh
-        result = 0
-        for n in range(byte_width):
-            result <<= 8
-            result += data[position + (byte_width - (n + 1))]
-
-        # convert the result uint to a signed int. check if the highest bit is set
-        bit_width = 8 * byte_width
-        if result >> (bit_width - 1):
-            # flip the sign bit
-            result ^= 1 << (bit_width - 1)
-
-            # subtract the two's complement offset
-            result -= 1 << (bit_width - 1)
-
-        # store the result
-        results[key] = result
-        position += byte_width
-    # check for a float type
-    elif _type in type_groups.float_types:
-        # get the number of bytes for this float type
-        byte_width = _type - type_groups.float_offset
-        
-        # put together a buffer of the specified number of bytes
-        buffer = b''
-        for n in range(byte_width):
-            buffer += data[position : position + 1]
-            position += 1
-
-        # unpack the float and add it to the results
-        if len(buffer) == 4:
-            results[key] = struct.unpack('f', buffer)[0]
-        elif len(buffer) == 8:
-            results[key] = struct.unpack('d', buffer)[0]
-        else:
-            raise ValueError('invalid byte width ' + str(len(buffer)) + ' for float type')
-    # check for a unit type
-    elif _type == types.unit:
-        # add None for this key
-        results[key] = None
-    # check for a fixed_array
-    elif isinstance(_type, types.fixed_array):
-        # get the length of the fixed array
-        obj_length = _type.length
-
-        # decode the specified number of objects into a list
-        obj_results = []
-        for n in range(obj_length):
-            temp_results, position = _deserialize_single(
-                key,
-                _schema,
-                _type.array_type,
-                data,
-                position,
-                results
-            )
-            obj_results.append(results[key])
-        
-        # add the list to the results
-        results[key] = obj_results
-    # check for a dynamic array
-    elif isinstance(_type, types.dynamic_array):
-        # first, read the u32 size specifier
-        byte_width = 4
-
-        # get the correct number of bytes, shifting left each time
-        # to conform with the little endian format of Borsh
-        obj_length = 0
-        for n in range(byte_width):
-            obj_length <<= 8
-            obj_length += data[position + (byte_width - (n + 1))]
-
-        # increment the buffer pointer
-        position += obj_length
-
-        # decode the specified number of objects into a list
-        obj_results = []
-        for n in range(obj_length):
-            temp_results, position = _deserialize_single(
-                key,
-                _schema,
-                _type.array_type,
-                data,
-                position,
-                results
-            )
-            obj_results.append(results[key])
-        
-        # add the list to the results
-        results[key] = obj_results
-    # check for a hashmap
-    elif isinstance(_type, types.hashmap):
-         # first, read the u32 size specifier
-        byte_width = 4
-
-        # get the correct number of bytes, shifting left each time
-        # to conform with the little endian format of Borsh
-        length = 0
-        for n in range(byte_width):
-            length <<= 8
-            length += data[position + (byte_width - (n + 1))]
-
-        # increment the buffer pointer
-        position += byte_width
-
-        # get the hashmap data
-        hashmap_data = {}
-        for n in range(length):
-            ret_data = {}
-            ret_data, position = _deserialize_single(
-                key,
-                _schema,
-                _type.hashmap_key_type,
-                data,
-                position,
-                results
-            )
-            new_key = ret_data[key]
-
-            ret_data = {}
-            ret_data, position = _deserialize_single(
-                key,
-                _schema,
-                _type.hashmap_value_type,
-                data,
-                position,
-                results
-            )
-            new_value = ret_data[key]
-
-            hashmap_data[new_key] = new_value
-
-        # store the hashmap data that we got
-        results[key] = hashmap_data
-    # check for a hashset
-    elif isinstance(_type, types.hashset):
-        # first, read the u32 size specifier
-        byte_width = 4
-
-        # get the correct number of bytes, shifting left each time
-        # to conform with the little endian format of Borsh
-        length = 0
-        for n in range(byte_width):
-            length <<= 8
-            length += data[position + (byte_width - (n + 1))]
-
-        # increment the buffer pointer
-        position += byte_width
-
-        # get the hashset data
-        set_data = []
-        for n in range(length):
-            ret_data = {}
-            ret_data, position = _deserialize_single(
-                key,
-                _schema,
-                _type.hashset_type,
-                data,
-                position,
-                results
-            )
-            set_data.append(ret_data[key])
-        
-        # convert the data to a set and add it to the results dict
-        results[key] = set(set_data)
-    # check for string data
-    elif _type == types.string:
-        # first, read the u32 size specifier
-        byte_width = 4
-
-        # get the correct number of bytes, shifting left each time
-        # to conform with the little endian format of Borsh
-        length = 0
-        for n in range(byte_width):
-            length <<= 8
-            length += data[position + (byte_width - (n + 1))]
-
-        # increment the buffer pointer
-        position += byte_width
-
-        # get the specified number of bytes and append them to a list of chars
-        result_chars = []
-        for n in range(length):
-            result_chars.append(chr(data[position]))
-            position += 1
-
-        # convert the list to a string and add it to the results
-        results[key] = ''.join(result_chars)
-    # check for an option
-    elif isinstance(_type, types.option):
-        # first, get the u8 '1' or '0' representing whether or not this option is present
-        option_present = data[position]
-        position += 1
-
-        # check if the option is here
-        if option_present:
-            results, position = _deserialize_single(
-                key,
-                _schema,
-                _type.option_type,
-                data,
-                position,
-                results
-            )
-        else:
-            results[key] = None
-    # check for a schema
-    elif isinstance(_type, types.struct):
-        # get the corresponding struct definition as a schema
-        struct_schema = schema(_schema[key].struct_dict)
-
-        # loop through all of the keys in the struct
-        struct_data = {}
-        for _key in _type.struct_dict:
-            temp_results = {}
-            temp_results, position = _deserialize_single(
-                _key,
-                _schema,
-                struct_schema[_key],
-                data,
-                position,
-                temp_results
-            )
-            
-            struct_data[_key] = temp_results[_key]
+# internal method for deserializing a record class instance from the specified position. not
+# intended to be called by user code; use 'as_record=True' with deserialize() or deserialize_from()
+def _record_at(_schema: schema, data: object, position: int) -> (record, int):
+    name = _schema._record_name if isinstance(_schema, schema) else schema._record_name
+    _codec = _get_codec(_schema)
+    if _codec.max_total_bytes is not None and len(data) - position > _codec.max_total_bytes:
+        return _limited_at(_record_at, _codec, _schema, data, position)
 
-        # add a new struct to the results
-        results[key] = types.struct(struct_data)
-    else:
-        raise NotImplementedError('deserializing \'' + str(key) + '\' not implemented yet')
+    try:
+        return _codec.record_decoder(name)(data, position)
+    except (IndexError, struct.error) as ie:
+        raise IndexError('out of data while reading record')
+
+# _project_at(_schema: schema, data: object, position: int, fields: list, need_end: bool) -> (dict, int)
+#
+# internal method for deserializing only the selected fields of a dict. not intended to be called
+# by user code; use the 'fields' argument of deserialize() or deserialize_from() instead
+def _project_at(_schema: schema, data: object, position: int, fields: list, need_end: bool) -> (dict, int):
+    if isinstance(fields, str):
+        fields = [fields]
+
+    _codec = _get_codec(_schema)
+    if _codec.max_total_bytes is not None and len(data) - position > _codec.max_total_bytes:
+        return _limited_at(_project_at, _codec, _codec, data, position, fields, need_end)
+
+    results = {}
+
+    try:
+        key = None
+        for key, step, store in _codec.projection(fields, need_end):
+            if store:
+                results[key], position = step(data, position)
+            else:
+                position = step(data, position)
+    except (IndexError, struct.error) as ie:
+        raise IndexError('out of data while reading value for key \'' + str(key) + '\'')
 
-    # return the new result dict and position
     return results, position
 
+# _limited_at(function: function, _codec: codec, _schema: schema, data: object, position: int, *args) -> object
+#
+# runs one of the functions above on a view of the buffer that ends max_total_bytes past the
+# position, for codecs with that limit set. a record that would run past the end of the view is
+# over the limit
+def _limited_at(function, _codec: codec, _schema: schema, data: object, position: int, *args) -> object:
+    try:
+        return function(_schema, memoryview(data)[: position + _codec.max_total_bytes], position, *args)
+    except IndexError:
+        raise ValueError('record is over max_total_bytes (' + str(_codec.max_total_bytes) + ')')
+
 # serialize(schema: schema, data: dict) -> bytes
 #
 # serializes the specified dict into a Borsh byte stream
 def serialize(schema: schema, data: dict) -> bytes:
-    results = b''
-
-    # loop over all of the keys in the schema. catch an index error when there
-    # is not enough data for the specified schema
-    try:
-        key = None
-        for key in schema:
-            results += _serialize_single(
-                key,
-                schema[key],
-                schema,
-                data
-            )
-    except IndexError as ie:
-        raise IndexError('out of data while reading value for key \'' + str(key) + '\'')
+    results = bytearray()
+    _serialize_append(schema, data, results)
 
     # return the serialized results
+    return bytes(results)
+
+# serialize_many(schema: schema, items: iterable, executor: Executor = None, chunk_size: int = None) -> list
+#
+# serializes a batch of values and returns a list of byte strings in the same order. when an
+# executor (such as a concurrent.futures.ThreadPoolExecutor) is given, the values are split into
+# chunks of chunk_size (by default, about four chunks per CPU) that are encoded on the executor.
+# encoding never changes the schema or the values, so both may be shared between threads; on
+# free-threaded builds of Python the chunks are encoded in parallel
+def serialize_many(schema: schema, items: object, executor: object = None, chunk_size: int = None) -> list:
+    # compile the schema once, up front, rather than in every thread
+    _codec = _get_codec(schema)
+
+    if executor is None:
+        return _serialize_chunk(_codec, items)
+
+    items = list(items)
+    if chunk_size is None:
+        chunk_size = max(1, -(-len(items) // ((os.cpu_count() or 1) * 4)))
+    elif not isinstance(chunk_size, int) or chunk_size <= 0:
+        raise ValueError('invalid chunk_size \'' + str(chunk_size) + '\' for serialize_many()')
+
+    chunks = [items[n : n + chunk_size] for n in range(0, len(items), chunk_size)]
+
+    results = []
+    for chunk in executor.map(_serialize_chunk, [_codec] * len(chunks), chunks):
+        results.extend(chunk)
+
     return results
 
-# _serialize_single(key: object, _type: object, data: bytes, position: int, results: dict) -> (dict, int)
+# _serialize_chunk(_codec: codec, items: iterable) -> list
 #
-# internal method for serializing a single Borsh object. not intended to be called by user code; use
-# the serialize() method instead
-def _serialize_single(key, _type, _schema, data: object) -> bytes:
-    # initialize a byte string to hold the results
-    results = b''
-
-    # check which type we have received
-    # first, check for a uint type
-    if _type in type_groups.uint_types:
-        # determine the byte width of this uint
-        byte_width = _type
-        
-        # convert the value to a byte string
-        results = data[key].to_bytes(byte_width, byteorder='little')
-    # then, check for a signed int type
-    elif _type in type_groups.int_types:
-        # determine the byte width of this int
-        byte_width = _type - type_groups.signed_int_offset
-
-        # convert the value to a byte string
-        results = data[key].to_bytes(byte_width, byteorder='little')
-    # check for a float type
-    elif _type in type_groups.float_types:
-        # determine the byte width of this float
-        byte_width = _type - type_groups.float_offset
-
-        # convert the value to a byte string
-        if byte_width == 4:
-            results = struct.pack('f', data[key])
-        elif byte_width == 8:
-            results = struct.pack('d', data[key])
-        else:
-            raise ValueError('invalid byte width ' + str(byte_width) + ' for float type')
-    # check for a unit type
-    elif _type == types.unit:
-        # don't do anything; return an empty byte string
-        pass
-    # check for a fixed_array
-    elif isinstance(_type, types.fixed_array):
-        # get the length of the fixed array
-        obj_length = _type.length
-        
-        # loop over the list that we received and add each value to the byte string
-        for n in range(obj_length):
-            results += _serialize_single(
-                key,
-                _type.array_type,
-                _schema,
-                {key: data[key][n]}
-            )
-    # check for a dynamic_array or a fixed_array
-    elif isinstance(_type, types.dynamic_array):
-        # store the length of the array as a u32
-        results = len(data[key]).to_bytes(4, byteorder='little')
-        
-        # loop over the list that we received and add each value to the byte string
-        for n in range(len(data[key])):
-            results += _serialize_single(
-                key,
-                _type.array_type,
-                _schema,
-                {key: data[key][n]}
-            )
-    # check for a hashmap
-    elif isinstance(_type, types.hashmap):
-        # store the length of the map as a u32
-        results = len(data[key]).to_bytes(4, byteorder='little')
-
-        # loop over all of the pairs in the hashmap
-        for _key in data[key].keys():
-            # serialize the key
-            results += _serialize_single(
-                key,
-                _type.hashmap_key_type,
-                _schema,
-                {key: _key}
-            )
+# serializes a list of values. this is the unit of work that serialize_many() hands to its executor
+def _serialize_chunk(_codec: codec, items: object) -> list:
+    results = []
+    for item in items:
+        out = bytearray()
+        _serialize_append(_codec, item, out)
+        results.append(bytes(out))
 
-            # serialize the value
-            results += _serialize_single(
-                key,
-                _type.hashmap_value_type,
-                _schema,
-                {key: data[key][_key]}
-            )
-    # check for a hashset
-    elif isinstance(_type, types.hashset):
-        # store the length of the set as a u32
-        results = len(data[key]).to_bytes(4, byteorder='little')
-
-        # sort the set
-        data[key] = sorted(data[key])
-        
-        # loop over the list that we received and add each int to the byte string
-        set_list = list(data[key])
-        for n in range(len(data[key])):
-            results += _serialize_single(
-                key,
-                _type.hashset_type,
-                _schema,
-                {key: set_list[n]}
-            )
-    # check for a string
-    elif _type == types.string:
-        # store the length of the string as a u32
-        results = len(data[key]).to_bytes(4, byteorder='little')
-
-        # store the actual string
-        results += bytes(data[key], 'utf-8')
-    # check for an option
-    elif isinstance(_type, types.option):
-        # see if the key is present in the data
-        if key in data.keys():
-            # make a copy of the schema and replace the option with
-            # the option subtype
-            _schema_dup = _schema
-            _schema_dup._inner_dict[key] = _type.option_type
-
-            results = b'\1' + _serialize_single(
-                key,
-                _type.option_type,
-                _schema_dup,
-                data
-            )
-        else:
-            results = b'\0'
-    # check for a struct
-    elif isinstance(_type, types.struct):
-        # get a reference to the struct and its schema
-        struct_obj = data[key]
-        struct_schema = schema(_schema[key].struct_dict)
-
-        # loop over all of the keys in the struct
-        for key in struct_obj.struct_dict.keys():
-            results += _serialize_single(
-                key,
-                struct_schema[key],
-                struct_schema,
-                {key: struct_obj.struct_dict[key]}
-            )
+    return results
+
+# serialize_into(schema: schema, data: dict, buffer: object, offset: int = 0) -> int
+#
+# serializes the specified dict into a caller-supplied writable buffer starting at the specified
+# offset and returns the offset just past the written data. a bytearray is grown as needed and
+# is appended to directly when the offset is at its end, which makes it cheap to reuse one
+# scratch buffer across many calls. any other writable buffer (memoryview, mmap, ...) must be
+# large enough to hold the result
+def serialize_into(schema: schema, data: dict, buffer: object, offset: int = 0) -> int:
+    if not isinstance(offset, int) or offset < 0:
+        raise ValueError('invalid offset \'' + str(offset) + '\' for serialize_into()')
+
+    # when writing at the end of a bytearray, encode straight into it. drop anything that
+    # was written if the encoding fails part way through
+    if isinstance(buffer, bytearray) and offset == len(buffer):
+        try:
+            _serialize_append(schema, data, buffer)
+        except BaseException:
+            del buffer[offset:]
+            raise
+
+        return len(buffer)
+
+    # otherwise, encode into a temporary buffer and copy it into place
+    results = bytearray()
+    _serialize_append(schema, data, results)
+    end = offset + len(results)
+
+    if isinstance(buffer, bytearray):
+        if offset > len(buffer):
+            raise ValueError('offset ' + str(offset) + ' is past the end of the buffer')
+
+        buffer[offset : end] = results
     else:
-        raise NotImplementedError('serializing \'' + str(_type) + '\' not implemented yet')
+        try:
+            view = memoryview(buffer)
+        except TypeError:
+            raise TypeError('serialize_into() expects a writable buffer, not \'' + str(buffer.__class__.__name__) + '\'')
+
+        with view:
+            if view.readonly:
+                raise TypeError('serialize_into() expects a writable buffer, received a read-only \'' +
+                    str(buffer.__class__.__name__) + '\'')
+
+            view = view.cast('B') if view.format != 'B' or view.ndim != 1 else view
+            if end > len(view):
+                raise ValueError('buffer too small: ' + str(len(results)) + ' bytes needed at offset ' + str(offset) +
+                    ', only ' + str(max(len(view) - offset, 0)) + ' available')
+
+            view[offset : end] = results
+
+    return end
+
+# patch(schema: schema, buffer: object, values: dict, offset: int = 0) -> None
+#
+# rewrites some of the keys of a record that is already encoded in a buffer, in place, without
+# decoding or encoding the rest of it. keys at a fixed offset (every key before the first one with
+# a variable size) are written straight to their offset; the others are found by skipping over the
+# keys before them. a key whose encoded size changes is spliced in, which moves the rest of the
+# record and so is only possible when the buffer is a bytearray
+def patch(schema: schema, buffer: object, values: dict, offset: int = 0) -> None:
+    if not isinstance(offset, int) or offset < 0:
+        raise ValueError('invalid offset \'' + str(offset) + '\' for patch()')
+    elif not isinstance(values, dict):
+        raise TypeError('patch() expects values to be a \'dict\', not \'' + str(values.__class__.__name__) + '\'')
+    elif not values:
+        return
+
+    patch_record = _get_codec(schema).patcher(values)
+    if isinstance(buffer, bytearray):
+        patch_record(buffer, values, offset)
+        return
+
+    try:
+        view = memoryview(buffer)
+    except TypeError:
+        raise TypeError('patch() expects a writable buffer, not \'' + str(buffer.__class__.__name__) + '\'')
+
+    with view:
+        if view.readonly:
+            raise TypeError('patch() expects a writable buffer, received a read-only \'' +
+                str(buffer.__class__.__name__) + '\'')
+
+        patch_record(view.cast('B') if view.format != 'B' or view.ndim != 1 else view, values, offset)
+
+# class _sink_buffer
+#
+# the internal buffer used by serialize_to(). encoders append to it as they would to any bytearray,
+# and whenever it holds at least buffer_size bytes it is handed to the sink and emptied, so only a
+# small part of the encoding is held in memory at once. 'flushed' counts the bytes handed over
+class _sink_buffer(bytearray):
+    __slots__ = ('write', 'buffer_size', 'flushed')
+
+    def __iadd__(self, data):
+        bytearray.__iadd__(self, data)
+        if len(self) >= self.buffer_size:
+            self.flush()
+
+        return self
+
+    def flush(self) -> None:
+        if self:
+            self.write(self)
+            self.flushed += len(self)
+            del self[:]
+
+# serialize_to(schema: schema, data: dict, sink: object, buffer_size: int = 65536) -> int
+#
+# serializes the specified dict straight into any object with a write() method (files), sendall()
+# (sockets) or update() (hashlib objects), without building the whole encoding in memory. encoded
+# data is passed to the sink in chunks of about buffer_size bytes, so the extra memory used is
+# bounded by buffer_size plus the largest single encoded value, such as one array of primitives.
+# the sink must consume every chunk before returning. returns the number of bytes written
+def serialize_to(schema: schema, data: dict, sink: object, buffer_size: int = 65536) -> int:
+    write = getattr(sink, 'write', None) or getattr(sink, 'sendall', None) or getattr(sink, 'update', None)
+    if write is None:
+        raise TypeError('serialize_to() expects an object with a write(), sendall() or update() method, not \'' +
+            str(sink.__class__.__name__) + '\'')
+    elif not isinstance(buffer_size, int) or buffer_size <= 0:
+        raise ValueError('invalid buffer_size \'' + str(buffer_size) + '\'')
+
+    out = _sink_buffer()
+    out.write = write
+    out.buffer_size = buffer_size
+    out.flushed = 0
+
+    _serialize_append(schema, data, out)
+    out.flush()
+
+    return out.flushed
+
+# hash(schema: schema, data: dict, algorithm: str = 'sha256') -> bytes
+#
+# returns the digest of the Borsh encoding of the specified dict, computed with any algorithm known
+# to hashlib.new(). the encoding is streamed into the hash with serialize_to(), so it is never held
+# in memory as a whole. note that this shadows the builtin hash() for the rest of this module
+def hash(schema: schema, data: dict, algorithm: str = 'sha256') -> bytes:
+    hasher = hashlib.new(algorithm)
+    serialize_to(schema, data, hasher)
+    return hasher.digest()
+
+# serialized_size(schema: schema, data: dict) -> int
+#
+# returns the exact number of bytes that serialize() would produce for the specified dict, without
+# encoding it. fixed-size keys are not looked at at all
+def serialized_size(schema: schema, data: dict) -> int:
+    _codec = _get_codec(schema)
+    if _codec.fixed_size is not None:
+        return _codec.fixed_size
+
+    # the sizers read keys from dicts, so records are measured by encoding them
+    if isinstance(data, record):
+        out = bytearray()
+        _serialize_append(_codec, data, out)
+        return len(out)
+
+    return _codec.sizer()(data)
+
+# _serialize_append(_schema: schema, data: dict, out: bytearray) -> None
+#
+# internal method for serializing a dict, or a record class instance, onto the end of a bytearray.
+# not intended to be called by user code; use serialize() or serialize_into() instead
+def _serialize_append(_schema: schema, data: dict, out: bytearray) -> None:
+    if isinstance(data, record):
+        try:
+            _get_codec(_schema).record_encoder()(data, out)
+        except IndexError as ie:
+            raise IndexError('out of data while writing record')
+
+        return
+
+    # loop over all of the compiled encoders in the schema. catch an index error when there
+    # is not enough data for the specified schema
+    try:
+        key = None
+        for key, get_value, encode_value in _get_codec(_schema).encoders:
+            encode_value(get_value(data), out)
+    except IndexError as ie:
+        raise IndexError('out of data while reading value for key \'' + str(key) + '\'')
 
-    return results
\ No newline at end of file
+# the streaming helpers, views, registry and decode cache are built on the functions above, so they are imported last
+from .stream import iter_records, RecordWriter
+from .view import lazy
+from .registry import Registry, anchor_discriminator
+from .cache import CachedDecoder
@@ -0,0 +1,177 @@
+import asyncio  # IncompleteReadError, get_running_loop
+import struct   # Struct
+from . import _get_codec, _deserialize_at, _serialize_append
+from .stream import _check_framing, _check_frame_length, _decode_frame
+
+# the u32 length prefix used by the 'u32_length_prefixed' framing
+_u32 = struct.Struct('<I')
+
+# _decode_records(_codec: codec, data: bytes, position: int) -> (list, int)
+#
+# decodes every complete record from the position onwards, and returns them along with the position
+# of the first incomplete one
+def _decode_records(_codec: object, data: bytes, position: int) -> (list, int):
+    records = []
+    while position < len(data):
+        try:
+            record, end = _deserialize_at(_codec, data, position)
+        except IndexError:
+            break
+
+        if end == position:
+            raise ValueError('cannot stream records of a schema that encodes to zero bytes')
+
+        records.append(record)
+        position = end
+
+    return records, position
+
+# _read_frame(reader: asyncio.StreamReader, length: int) -> bytes
+#
+# reads exactly 'length' bytes. returns None if the stream ended cleanly before any of them were
+# read, and raises an IndexError if it ended part way through
+async def _read_frame(reader: object, length: int) -> bytes:
+    try:
+        return await reader.readexactly(length)
+    except asyncio.IncompleteReadError as ire:
+        if not ire.partial:
+            return None
+
+        raise IndexError('out of data while reading record of ' + str(length) + ' bytes')
+
+# read_records(schema: schema, reader: asyncio.StreamReader, framing: str = 'concatenated', ...) -> async generator
+#
+# reads records from an asyncio.StreamReader and yields them one at a time, using the same framings
+# as borsh.iter_records(). length-prefixed records, and records of fixed-size schemas, are read with
+# a single readexactly() call. records that are at least offload_threshold bytes long are decoded in
+# 'executor' (the default executor if None) so that large payloads do not stall the event loop. with
+# no framing and a variable size, the records in the buffer are decoded in the executor whenever
+# it holds at least offload_threshold bytes
+async def read_records(schema: object, reader: object, framing: str = 'concatenated', chunk_size: int = 65536,
+    offload_threshold: int = 1 << 20, executor: object = None):
+    _check_framing(framing)
+    _codec = _get_codec(schema)
+    loop = asyncio.get_running_loop()
+
+    # decode a complete frame, handing it off to the executor if it is large
+    async def decode(frame):
+        if len(frame) >= offload_threshold:
+            return await loop.run_in_executor(executor, _decode_frame, _codec, frame)
+
+        return _decode_frame(_codec, frame)
+
+    if framing == 'u32_length_prefixed':
+        while True:
+            header = await _read_frame(reader, 4)
+            if header is None:
+                return
+
+            length = _u32.unpack(header)[0]
+            _check_frame_length(_codec, length)
+
+            frame = await _read_frame(reader, length)
+            if frame is None:
+                raise IndexError('out of data while reading record of ' + str(length) + ' bytes')
+
+            yield await decode(frame)
+    elif _codec.fixed_size:
+        while True:
+            frame = await _read_frame(reader, _codec.fixed_size)
+            if frame is None:
+                return
+
+            yield await decode(frame)
+
+    # with no framing and a variable size, the only way to know that a record is complete is to
+    # decode it. chunks are collected in a list and joined onto the unread bytes only once there is
+    # enough to try again: after a record is left incomplete, that is once the buffer has at least
+    # doubled, so that a large record is copied and decoded a logarithmic number of times rather
+    # than once per read. every complete record in the buffer is decoded in one go, in the executor
+    # if the buffer is large
+    data = b''
+    position = 0
+    chunks = []
+    pending = 0
+    retry_size = 1
+    while True:
+        chunk = await reader.read(chunk_size)
+        if chunk:
+            chunks.append(chunk)
+            pending += len(chunk)
+            if len(data) - position + pending < retry_size:
+                continue
+        elif not pending:
+            if position < len(data):
+                # raise the error for the incomplete record
+                _deserialize_at(_codec, data, position)
+
+            return
+
+        chunks.insert(0, memoryview(data)[position:])
+        data = b''.join(chunks)
+        position = 0
+        chunks = []
+        pending = 0
+
+        if len(data) >= offload_threshold:
+            records, position = await loop.run_in_executor(executor, _decode_records, _codec, data, position)
+        else:
+            records, position = _decode_records(_codec, data, position)
+
+        for record in records:
+            yield record
+
+        retry_size = 2 * (len(data) - position) or 1
+
+# write_records(schema: schema, writer: asyncio.StreamWriter, records: iterable, framing: str = 'concatenated', ...) -> int
+#
+# serializes records from an iterable or async iterable and writes them to an asyncio.StreamWriter,
+# using the same framings as borsh.RecordWriter. records are batched into writes of at least
+# buffer_size bytes, and writer.drain() is awaited after each write so that the transport's flow
+# control is respected. returns the number of records written
+async def write_records(schema: object, writer: object, records: object, framing: str = 'concatenated',
+    buffer_size: int = 65536) -> int:
+    _check_framing(framing)
+    _codec = _get_codec(schema)
+    length_prefixed = framing == 'u32_length_prefixed'
+
+    buffer = bytearray()
+    count = 0
+
+    def append(record):
+        start = len(buffer)
+        try:
+            if length_prefixed:
+                # reserve space for the length and fill it in once the record has been written
+                buffer.extend(b'\0\0\0\0')
+                _serialize_append(_codec, record, buffer)
+                _u32.pack_into(buffer, start, len(buffer) - start - 4)
+            else:
+                _serialize_append(_codec, record, buffer)
+        except BaseException:
+            # never leave a partial record behind in the buffer
+            del buffer[start:]
+            raise
+
+    async def flush():
+        writer.write(bytes(buffer))
+        del buffer[:]
+        await writer.drain()
+
+    if hasattr(records, '__aiter__'):
+        async for record in records:
+            append(record)
+            count += 1
+            if len(buffer) >= buffer_size:
+                await flush()
+    else:
+        for record in records:
+            append(record)
+            count += 1
+            if len(buffer) >= buffer_size:
+                await flush()
+
+    if buffer:
+        await flush()
+
+    return count
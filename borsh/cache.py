@@ -0,0 +1,150 @@
+import collections  # OrderedDict
+import threading    # Lock
+import types as _builtin_types  # MappingProxyType
+from . import _get_codec, _as_buffer, _deserialize_at, _record_at, types, record, variant, numpy
+from .types import _wrap_struct
+
+_mapping_proxy = _builtin_types.MappingProxyType
+
+# _freeze(value: object) -> object
+#
+# returns a read-only copy of a decoded value: lists become tuples, sets become frozensets, and
+# dicts, including the dicts inside structs, become read-only mappings. records and variants keep
+# their classes with their contents frozen, and numpy arrays are marked read-only. everything else
+# that a decoder returns is already immutable
+def _freeze(value: object) -> object:
+    value_class = value.__class__
+    if value_class is list:
+        return tuple([_freeze(item) for item in value])
+    elif value_class is dict:
+        return _mapping_proxy({key: _freeze(item) for key, item in value.items()})
+    elif value_class is set:
+        return frozenset(value)
+    elif value_class is types.struct:
+        return _wrap_struct(_mapping_proxy({key: _freeze(item) for key, item in value.struct_dict.items()}))
+    elif isinstance(value, (record, variant)):
+        return tuple.__new__(value_class, [_freeze(item) for item in value])
+    elif numpy is not None and isinstance(value, numpy.ndarray):
+        value.flags.writeable = False
+
+    return value
+
+# class CachedDecoder
+#
+# decodes payloads with a schema, remembering the value decoded from each distinct payload. pollers
+# that fetch the same accounts over and over mostly see bytes that have not changed, and with a
+# cache in front of deserialize() those cost a dict lookup on the payload rather than a decode.
+# the cache holds at most maxsize payloads and, if max_bytes is given, at most that many payload
+# bytes, dropping the least recently used ones first. values are shared between every hit on the
+# same payload, so they are frozen once when they are decoded (see _freeze()) and cannot be changed
+# by any caller. a decoder may be shared between threads; the hit and miss counters are not locked,
+# so they may undercount slightly when it is
+class CachedDecoder:
+    maxsize = None
+    max_bytes = None
+    as_record = False
+
+    hits = 0
+    misses = 0
+
+    # the total size of the cached payloads, in bytes
+    nbytes = 0
+
+    _schema = None
+    _codec = None
+
+    # {payload: value}, least recently used first
+    _values = None
+
+    # held while looking up, adding and evicting entries, so that the order of the entries and
+    # nbytes are never changed by two threads at once
+    _lock = None
+
+    def __init__(self, schema: object, maxsize: int = 1024, max_bytes: int = None, as_record: bool = False):
+        if not isinstance(maxsize, int) or maxsize <= 0:
+            raise ValueError('invalid maxsize \'' + str(maxsize) + '\' (expected a positive number of entries)')
+        elif max_bytes is not None and (not isinstance(max_bytes, int) or max_bytes <= 0):
+            raise ValueError('invalid max_bytes \'' + str(max_bytes) + '\' (expected a positive number of bytes)')
+
+        self.maxsize = maxsize
+        self.max_bytes = max_bytes
+        self.as_record = as_record
+        self._schema = schema
+        self._codec = _get_codec(schema)
+        self._values = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    # deserialize(data: bytes) -> dict
+    #
+    # returns the read-only value decoded from a payload, which may be any object supporting the
+    # buffer protocol. the payload is decoded only if it is not already cached
+    def deserialize(self, data: object) -> object:
+        # the payload bytes are the key itself, so a hit can never return the value of a different
+        # payload that happens to share a hash
+        key = data if data.__class__ is bytes else bytes(_as_buffer(data, 'deserialize'))
+
+        values = self._values
+        with self._lock:
+            value = values.get(key)
+            if value is not None:
+                values.move_to_end(key)
+
+        if value is not None:
+            self.hits += 1
+            return value
+
+        self.misses += 1
+        if self.as_record:
+            value = _freeze(_record_at(self._schema, key, 0)[0])
+        else:
+            value = _freeze(_deserialize_at(self._codec, key, 0)[0])
+
+        # payloads larger than the whole cache are decoded but not kept
+        if self.max_bytes is not None and len(key) > self.max_bytes:
+            return value
+
+        with self._lock:
+            if key not in values:
+                values[key] = value
+                self.nbytes += len(key)
+                self._evict()
+
+        return value
+
+    # _evict() -> None
+    #
+    # drops the least recently used payloads until the cache is within both of its bounds. the
+    # lock must be held
+    def _evict(self) -> None:
+        values = self._values
+        while len(values) > self.maxsize or (self.max_bytes is not None and self.nbytes > self.max_bytes):
+            try:
+                key = values.popitem(False)[0]
+            except KeyError:
+                break
+
+            self.nbytes -= len(key)
+
+    # stats() -> dict
+    #
+    # returns the hit and miss counters along with the current size of the cache
+    def stats(self) -> dict:
+        return {'hits': self.hits, 'misses': self.misses, 'entries': len(self._values), 'bytes': self.nbytes}
+
+    def clear(self) -> None:
+        with self._lock:
+            self._values.clear()
+            self.nbytes = 0
+
+    def __call__(self, data: object) -> object:
+        return self.deserialize(data)
+
+    def __contains__(self, data):
+        return bytes(data) in self._values
+
+    def __len__(self):
+        return len(self._values)
+
+    def __repr__(self):
+        return 'CachedDecoder(' + str(len(self._values)) + ' entries, ' + str(self.hits) + ' hits, ' + \
+            str(self.misses) + ' misses)'
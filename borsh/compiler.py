@@ -0,0 +1,1622 @@
+import array        # array
+import collections  # OrderedDict
+import keyword      # iskeyword
+import operator     # attrgetter, itemgetter, methodcaller
+import struct       # Struct
+import threading    # Lock
+from .types import types, type_groups, _wrap_struct
+
+# numpy is optional. it is only used when a schema opts in with 'use_numpy=True'
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# struct format characters for the primitive types that the struct module can handle directly.
+# u128 and i128 are not present since struct has no format for 16 byte integers
+_primitive_formats = {
+    types.u8: 'B',
+    types.u16: 'H',
+    types.u32: 'I',
+    types.u64: 'Q',
+    types.i8: 'b',
+    types.i16: 'h',
+    types.i32: 'i',
+    types.i64: 'q',
+    types.f32: 'f',
+    types.f64: 'd'
+}
+
+# _primitive_format(_type: object) -> str
+#
+# returns the struct format character for a fixed-width primitive type, or None for any other type
+def _primitive_format(_type: object) -> str:
+    if isinstance(_type, int) and _type in _primitive_formats:
+        return _primitive_formats[_type]
+
+    return None
+
+# _array_typecode(format_char: str) -> str
+#
+# returns the array module typecode with the same size and signedness as a struct format character.
+# the sizes of the array typecodes are platform dependent, so they are matched up by item size
+def _array_typecode(format_char: str) -> str:
+    if format_char in 'fd':
+        return format_char
+
+    candidates = 'BHILQ' if format_char.isupper() else 'bhilq'
+    for typecode in candidates:
+        if array.array(typecode).itemsize == struct.calcsize('<' + format_char):
+            return typecode
+
+    return None
+
+# the u32 length prefix used by dynamic arrays, hashmaps, hashsets and strings
+_u32 = struct.Struct('<I')
+
+# _read_u32(data: bytes, position: int) -> (int, int)
+#
+# reads a u32 length prefix from the buffer and returns it along with the new position
+def _read_u32(data, position: int) -> (int, int):
+    return _u32.unpack_from(data, position)[0], position + 4
+
+# _check_count(data: bytes, position: int, count: int, min_item_size: int, max_count: int) -> None
+#
+# checks the item count read from a length prefix before any items are decoded. the count may not
+# be over max_count (if it is not None), and the items must be able to fit in the rest of the
+# buffer, so that a hostile prefix fails at once instead of after billions of iterations. schemas
+# refuse collections of zero-sized items, for which the second check would always pass
+def _check_count(data, position: int, count: int, min_item_size: int, max_count: int) -> None:
+    if max_count is not None and count > max_count:
+        raise ValueError('collection length ' + str(count) + ' is over max_collection_len (' + str(max_count) + ')')
+    elif position + count * min_item_size > len(data):
+        raise IndexError('out of data')
+
+# the longest string, in bytes, that is looked up in a string table. longer strings are unlikely
+# to repeat and are always decoded
+_intern_max_length = 64
+
+# class _string_table
+#
+# a bounded table of decoded strings, keyed by their encoded bytes, that is shared by every decoder
+# of a codec. when the same short string is decoded again, the existing str object is returned, so
+# many records holding the same value share a single copy of it. once the table holds maxsize
+# strings, the least recently used one is dropped. the table is shared by every thread decoding
+# with the codec, so it is only read or changed with its lock held
+class _string_table:
+    strings = None
+    maxsize = None
+    lock = None
+
+    def __init__(self, maxsize: int):
+        if not isinstance(maxsize, int) or maxsize < 0:
+            raise ValueError('invalid intern_strings \'' + str(maxsize) + '\' (expected a number of strings)')
+
+        self.strings = collections.OrderedDict()
+        self.maxsize = maxsize
+        self.lock = threading.Lock()
+
+# _compile_decoder(_type: object, use_numpy: bool = False, record_name: str = None, strings: _string_table = None, max_collection_len: int = None) -> function
+#
+# walks the type tree once and returns a decoder function for the specified Borsh type. every
+# decoder has the signature decode(data, position) -> (value, position). when record_name is set,
+# structs are decoded into generated record classes (see _record_class()) instead of dicts, and the
+# structs directly inside this type use record_name as the name of their class. when a string table
+# is given, short strings are looked up in it rather than decoded every time. when max_collection_len
+# is given, dynamic arrays, hashmaps and hashsets with more items than that are rejected
+def _compile_decoder(_type: object, use_numpy: bool = False, record_name: str = None, strings: object = None, max_collection_len: int = None):
+    # first, check for a primitive type that struct can decode for us
+    if _primitive_format(_type) is not None:
+        primitive_struct = struct.Struct('<' + _primitive_format(_type))
+        unpack_from = primitive_struct.unpack_from
+        byte_width = primitive_struct.size
+
+        def decode_primitive(data, position):
+            return unpack_from(data, position)[0], position + byte_width
+
+        return decode_primitive
+    # then, check for the 128 bit integer types
+    elif isinstance(_type, int) and _type in (types.u128, types.i128):
+        signed = _type in type_groups.int_types
+        byte_width = 16
+
+        def decode_int128(data, position):
+            end = position + byte_width
+            if end > len(data):
+                raise IndexError('out of data')
+
+            return int.from_bytes(data[position : end], 'little', signed=signed), end
+
+        return decode_int128
+    # check for a unit type
+    elif _type is types.unit:
+        def decode_unit(data, position):
+            return None, position
+
+        return decode_unit
+    # check for a byte array
+    elif isinstance(_type, types.bytes):
+        obj_length = _type.length
+        zero_copy = _type.zero_copy
+
+        def decode_bytes(data, position):
+            # fixed length byte arrays have no length prefix
+            length = obj_length
+            if length is None:
+                length, position = _read_u32(data, position)
+
+            end = position + length
+            if end > len(data):
+                raise IndexError('out of data')
+
+            if zero_copy:
+                return memoryview(data)[position : end], end
+
+            return bytes(data[position : end]), end
+
+        return decode_bytes
+    # check for a fixed_array
+    elif isinstance(_type, types.fixed_array):
+        obj_length = _type.length
+
+        # arrays of primitives are a run of identical values and can be unpacked in one call
+        item_format = _primitive_format(_type.array_type)
+        if item_format is not None and use_numpy:
+            dtype = numpy.dtype('<' + item_format)
+            byte_width = obj_length * dtype.itemsize
+
+            # return a read-only view into the source buffer rather than a copy
+            def decode_fixed_numpy_array(data, position):
+                end = position + byte_width
+                if end > len(data):
+                    raise IndexError('out of data')
+
+                return numpy.frombuffer(data, dtype, obj_length, position), end
+
+            return decode_fixed_numpy_array
+        elif item_format is not None:
+            array_struct = struct.Struct('<' + str(obj_length) + item_format)
+            unpack_from = array_struct.unpack_from
+            byte_width = array_struct.size
+
+            def decode_fixed_primitive_array(data, position):
+                return list(unpack_from(data, position)), position + byte_width
+
+            return decode_fixed_primitive_array
+
+        decode_item = _compile_decoder(_type.array_type, use_numpy, record_name, strings, max_collection_len)
+
+        def decode_fixed_array(data, position):
+            obj_results = []
+            for n in range(obj_length):
+                value, position = decode_item(data, position)
+                obj_results.append(value)
+
+            return obj_results, position
+
+        return decode_fixed_array
+    # check for a dynamic array
+    elif isinstance(_type, types.dynamic_array):
+        # arrays of primitives are unpacked in one call once their length is known. the struct
+        # module caches the compiled format for each length that it sees
+        item_format = _primitive_format(_type.array_type)
+        if item_format is not None and use_numpy:
+            dtype = numpy.dtype('<' + item_format)
+            item_width = dtype.itemsize
+
+            def decode_dynamic_numpy_array(data, position):
+                obj_length, position = _read_u32(data, position)
+                if max_collection_len is not None and obj_length > max_collection_len:
+                    _check_count(data, position, obj_length, item_width, max_collection_len)
+
+                end = position + obj_length * item_width
+                if end > len(data):
+                    raise IndexError('out of data')
+
+                return numpy.frombuffer(data, dtype, obj_length, position), end
+
+            return decode_dynamic_numpy_array
+        elif item_format is not None:
+            item_width = struct.calcsize('<' + item_format)
+
+            def decode_dynamic_primitive_array(data, position):
+                obj_length, position = _read_u32(data, position)
+
+                end = position + obj_length * item_width
+                if end > len(data) or (max_collection_len is not None and obj_length > max_collection_len):
+                    _check_count(data, position, obj_length, item_width, max_collection_len)
+
+                return list(struct.unpack_from('<' + str(obj_length) + item_format, data, position)), end
+
+            return decode_dynamic_primitive_array
+
+        decode_item = _compile_decoder(_type.array_type, use_numpy, record_name, strings, max_collection_len)
+        item_size = _min_size(_type.array_type)
+
+        def decode_dynamic_array(data, position):
+            obj_length, position = _read_u32(data, position)
+            _check_count(data, position, obj_length, item_size, max_collection_len)
+
+            obj_results = []
+            for n in range(obj_length):
+                value, position = decode_item(data, position)
+                obj_results.append(value)
+
+            return obj_results, position
+
+        return decode_dynamic_array
+    # check for a hashmap
+    elif isinstance(_type, types.hashmap):
+        decode_key = _compile_decoder(_type.hashmap_key_type, use_numpy, record_name, strings, max_collection_len)
+        decode_value = _compile_decoder(_type.hashmap_value_type, use_numpy, record_name, strings, max_collection_len)
+        pair_size = _min_size(_type.hashmap_key_type) + _min_size(_type.hashmap_value_type)
+
+        def decode_hashmap(data, position):
+            length, position = _read_u32(data, position)
+            _check_count(data, position, length, pair_size, max_collection_len)
+
+            hashmap_data = {}
+            for n in range(length):
+                new_key, position = decode_key(data, position)
+                hashmap_data[new_key], position = decode_value(data, position)
+
+            return hashmap_data, position
+
+        return decode_hashmap
+    # check for a hashset
+    elif isinstance(_type, types.hashset):
+        decode_item = _compile_decoder(_type.hashset_type, use_numpy, record_name, strings, max_collection_len)
+        item_size = _min_size(_type.hashset_type)
+
+        def decode_hashset(data, position):
+            length, position = _read_u32(data, position)
+            _check_count(data, position, length, item_size, max_collection_len)
+
+            set_data = set()
+            for n in range(length):
+                value, position = decode_item(data, position)
+                set_data.add(value)
+
+            return set_data, position
+
+        return decode_hashset
+    # check for string data
+    elif _type is types.string and strings is not None:
+        table = strings.strings
+        move_to_end = table.move_to_end
+        maxsize = strings.maxsize
+        lock = strings.lock
+
+        def decode_interned_string(data, position):
+            length, position = _read_u32(data, position)
+
+            end = position + length
+            if end > len(data):
+                raise IndexError('out of data')
+            elif length > _intern_max_length:
+                return str(data[position : end], 'utf-8'), end
+
+            raw = bytes(data[position : end])
+            with lock:
+                value = table.get(raw)
+                if value is not None:
+                    move_to_end(raw)
+                    return value, end
+
+            # decode outside of the lock. if another thread adds the same string in the meantime,
+            # its copy is the one that is kept and returned
+            value = raw.decode('utf-8')
+            with lock:
+                value = table.setdefault(raw, value)
+                if len(table) > maxsize:
+                    table.popitem(False)
+
+            return value, end
+
+        return decode_interned_string
+    elif _type is types.string:
+        def decode_string(data, position):
+            length, position = _read_u32(data, position)
+
+            end = position + length
+            if end > len(data):
+                raise IndexError('out of data')
+
+            # str() decodes straight from a slice of bytes or of a memoryview
+            return str(data[position : end], 'utf-8'), end
+
+        return decode_string
+    # check for an option
+    elif isinstance(_type, types.option):
+        decode_inner = _compile_decoder(_type.option_type, use_numpy, record_name, strings, max_collection_len)
+
+        def decode_option(data, position):
+            # get the u8 '1' or '0' representing whether or not this option is present
+            option_present = data[position]
+            if option_present:
+                return decode_inner(data, position + 1)
+
+            return None, position + 1
+
+        return decode_option
+    # check for an enum. the tag is used directly as an index into the list of variant decoders.
+    # in record mode, struct payloads are decoded into record classes named after their variant
+    elif isinstance(_type, types.enum):
+        variants = [(name, _compile_decoder(payload, use_numpy, name if record_name is not None else None, strings, max_collection_len))
+            for name, payload in _type.variants]
+        count = len(variants)
+        new = tuple.__new__
+
+        def decode_enum(data, position):
+            tag = data[position]
+            if tag >= count:
+                raise ValueError('invalid enum tag ' + str(tag) + ' (expected less than ' + str(count) + ')')
+
+            name, decode_payload = variants[tag]
+            value, position = decode_payload(data, position + 1)
+            return new(variant, (name, value)), position
+
+        return decode_enum
+    # check for a struct
+    elif isinstance(_type, types.struct):
+        if record_name is not None:
+            return _compile_record_class_decoder(_type.struct_dict, record_name, use_numpy, strings, max_collection_len)
+
+        decode_record = _compile_record_decoder(_type.struct_dict, use_numpy, strings, max_collection_len)
+
+        def decode_struct(data, position):
+            struct_data, position = decode_record(data, position)
+            return _wrap_struct(struct_data), position
+
+        return decode_struct
+    else:
+        raise NotImplementedError('deserializing \'' + str(_type) + '\' not implemented yet')
+
+# _group_runs(schema_def: dict) -> list
+#
+# splits the keys of a {key: type} dict into groups, in order. consecutive keys whose types
+# have a struct format are grouped into a single run so that they can be handled by one
+# struct.Struct call. every other key is placed in a group of its own
+def _group_runs(schema_def: dict) -> list:
+    groups = []
+    run = []
+    for key in schema_def:
+        if _primitive_format(schema_def[key]) is not None:
+            run.append(key)
+            continue
+
+        if run:
+            groups.append(run)
+            run = []
+        groups.append([key])
+
+    if run:
+        groups.append(run)
+
+    return groups
+
+# _run_struct(schema_def: dict, keys: list) -> struct.Struct
+#
+# builds the precomputed struct for a run of fixed-width primitive keys
+def _run_struct(schema_def: dict, keys: list) -> struct.Struct:
+    return struct.Struct('<' + ''.join(_primitive_formats[schema_def[key]] for key in keys))
+
+# _compile_fields_decoder(schema_def: dict, use_numpy: bool = False, records: bool = False, strings: _string_table = None, max_collection_len: int = None) -> list
+#
+# compiles a list of (key, run_keys, decoder) triples for an ordered set of {key: type} pairs,
+# such as a schema or the body of a struct. for a single key, run_keys is None and the decoder
+# returns one value. for a run of primitive keys, run_keys holds every key in the run and the
+# decoder returns a tuple with one value per key. when records is set, structs inside the keys are
+# decoded into record classes named after their key
+def _compile_fields_decoder(schema_def: dict, use_numpy: bool = False, records: bool = False, strings: object = None, max_collection_len: int = None) -> list:
+    fields = []
+    for keys in _group_runs(schema_def):
+        if len(keys) == 1:
+            record_name = _record_class_name(keys[0]) if records else None
+            fields.append((keys[0], None, _compile_decoder(schema_def[keys[0]], use_numpy, record_name, strings, max_collection_len)))
+            continue
+
+        run_struct = _run_struct(schema_def, keys)
+        fields.append((keys[0], tuple(keys), _compile_run_decoder(run_struct)))
+
+    return fields
+
+# _compile_run_decoder(run_struct: struct.Struct) -> function
+#
+# returns a decoder that unpacks a whole run of primitive values with a single call
+def _compile_run_decoder(run_struct: struct.Struct):
+    unpack_from = run_struct.unpack_from
+    byte_width = run_struct.size
+
+    def decode_run(data, position):
+        return unpack_from(data, position), position + byte_width
+
+    return decode_run
+
+# _compile_record_decoder(schema_def: dict, use_numpy: bool = False, strings: _string_table = None, max_collection_len: int = None) -> function
+#
+# compiles a decoder for an ordered set of {key: type} pairs. the decoder returns a new dict
+# holding every key
+def _compile_record_decoder(schema_def: dict, use_numpy: bool = False, strings: object = None, max_collection_len: int = None):
+    fields = _compile_fields_decoder(schema_def, use_numpy, False, strings, max_collection_len)
+
+    def decode_record(data, position):
+        results = {}
+        for key, run_keys, decode_value in fields:
+            if run_keys is None:
+                results[key], position = decode_value(data, position)
+            else:
+                values, position = decode_value(data, position)
+                results.update(zip(run_keys, values))
+
+        return results, position
+
+    return decode_record
+
+# class record
+#
+# the base class of every generated record class (see _record_class()). records are tuples, so they
+# take no more memory than a tuple of their values, and every key is also available as an attribute
+class record(tuple):
+    __slots__ = ()
+    _fields = ()
+
+    def __new__(cls, *values):
+        if len(values) != len(cls._fields):
+            raise TypeError(cls.__name__ + '() takes ' + str(len(cls._fields)) + ' values, received ' + str(len(values)))
+
+        return tuple.__new__(cls, values)
+
+    # _asdict() -> dict
+    #
+    # returns the values of the record as a new dict, in schema order
+    def _asdict(self) -> dict:
+        return dict(zip(self._fields, self))
+
+    # records are pickled by their class name and keys rather than by a reference to their class,
+    # which is generated and so cannot be found by name. they are unpickled into the class that
+    # _record_class() returns for the same name and keys
+    def __reduce__(self):
+        return (_unpickle_record, (self.__class__.__name__, self._fields, tuple(self)))
+
+    def __repr__(self):
+        return self.__class__.__name__ + '(' + ', '.join(key + '=' + repr(value)
+            for key, value in zip(self._fields, self)) + ')'
+
+# class variant
+#
+# a decoded enum value: a (name, value) pair holding the name of the variant and its payload, which
+# is None for unit variants. plain tuples are accepted in its place when encoding
+class variant(tuple):
+    __slots__ = ()
+
+    def __new__(cls, name: str, value: object = None):
+        return tuple.__new__(cls, (name, value))
+
+    @property
+    def name(self) -> str:
+        return self[0]
+
+    @property
+    def value(self) -> object:
+        return self[1]
+
+    def __getnewargs__(self):
+        return tuple(self)
+
+    def __repr__(self):
+        return 'variant(' + repr(self[0]) + ', ' + repr(self[1]) + ')'
+
+# _variant_parts(value: object) -> (str, object)
+#
+# splits a value to be encoded as an enum into its variant name and payload. the value may be a
+# variant (or any (name, payload) pair), the name of a unit variant, or a record class instance, in
+# which case the name of its class is the name of the variant
+def _variant_parts(value: object) -> (str, object):
+    if value.__class__ is str:
+        return value, None
+    elif isinstance(value, record):
+        return value.__class__.__name__, value
+
+    name, payload = value
+    return name, payload
+
+# _record_class_name(key: str) -> str
+#
+# returns the class name used for a struct stored under a key, such as 'FeeConfig' for 'fee_config'
+def _record_class_name(key: str) -> str:
+    return ''.join(part[:1].upper() + part[1:] for part in key.split('_')) or 'Record'
+
+# the record classes generated so far, keyed by (name, keys). a class depends only on its name and
+# keys, so every schema asking for the same ones, and every unpickled record, shares one class
+_record_classes = {}
+
+# _record_class(schema_def: dict, name: str) -> class
+#
+# returns the record class with one attribute per key, in schema order, generating it on first
+# use. keys must be valid Python identifiers that do not start with an underscore
+def _record_class(schema_def: dict, name: str) -> type:
+    cache_key = (name, tuple(schema_def))
+    record_class = _record_classes.get(cache_key)
+    if record_class is not None:
+        return record_class
+
+    for key in schema_def:
+        if not key.isidentifier() or keyword.iskeyword(key) or key.startswith('_'):
+            raise ValueError('key \'' + key + '\' cannot be used as a record attribute')
+
+    namespace = {'__slots__': (), '_fields': tuple(schema_def)}
+    for index, key in enumerate(schema_def):
+        namespace[key] = property(operator.itemgetter(index), doc='the value of \'' + key + '\'')
+
+    return _record_classes.setdefault(cache_key, type(name, (record,), namespace))
+
+# _unpickle_record(name: str, keys: tuple, values: tuple) -> record
+#
+# rebuilds a pickled record (see record.__reduce__())
+def _unpickle_record(name: str, keys: tuple, values: tuple) -> record:
+    return tuple.__new__(_record_class(dict.fromkeys(keys), name), values)
+
+# _compile_record_class_decoder(schema_def: dict, name: str, use_numpy: bool = False, strings: _string_table = None, max_collection_len: int = None) -> function
+#
+# compiles a decoder for an ordered set of {key: type} pairs that returns an instance of a new
+# record class. the class is available as the 'record_class' attribute of the decoder
+def _compile_record_class_decoder(schema_def: dict, name: str, use_numpy: bool = False, strings: object = None, max_collection_len: int = None):
+    fields = _compile_fields_decoder(schema_def, use_numpy, True, strings, max_collection_len)
+    record_class = _record_class(schema_def, name)
+    new = tuple.__new__
+
+    def decode_record(data, position):
+        values = []
+        for key, run_keys, decode_value in fields:
+            if run_keys is None:
+                value, position = decode_value(data, position)
+                values.append(value)
+            else:
+                run_values, position = decode_value(data, position)
+                values.extend(run_values)
+
+        return new(record_class, values), position
+
+    decode_record.record_class = record_class
+    return decode_record
+
+# _compile_sort_key(_type: object) -> function
+#
+# returns a sort key that orders values of the specified type the way Rust's derived Ord does,
+# which is the order that Borsh writes the items of a set in: enums by their tag rather than their
+# name, None before any other value of an option, and structs key by key. returns None when Python
+# already orders the values the same way, as it does for numbers, strings, bytes and arrays of them
+def _compile_sort_key(_type: object):
+    if isinstance(_type, (types.fixed_array, types.dynamic_array)):
+        item_key = _compile_sort_key(_type.array_type)
+        if item_key is None:
+            return None
+
+        def sort_array(value):
+            return tuple([item_key(item) for item in value])
+
+        return sort_array
+    elif isinstance(_type, types.option):
+        inner_key = _compile_sort_key(_type.option_type) or _identity
+
+        def sort_option(value):
+            return (0,) if value is None else (1, inner_key(value))
+
+        return sort_option
+    elif isinstance(_type, types.enum):
+        variants = {name: (tag, _compile_sort_key(payload) or _identity)
+            for tag, (name, payload) in enumerate(_type.variants)}
+
+        def sort_enum(value):
+            name, payload = _variant_parts(value)
+            try:
+                tag, payload_key = variants[name]
+            except KeyError:
+                raise ValueError('unknown enum variant \'' + str(name) + '\'')
+
+            return (tag, payload_key(payload))
+
+        return sort_enum
+    elif isinstance(_type, types.struct):
+        keys = list(_type.struct_dict)
+        field_keys = [_compile_sort_key(_type.struct_dict[key]) or _identity for key in keys]
+
+        # structs may be 'types.struct' values or record class instances, whose values are already
+        # in schema order
+        def sort_struct(value):
+            values = value if isinstance(value, record) else [value.struct_dict.get(key) for key in keys]
+            return tuple([field_key(item) for field_key, item in zip(field_keys, values)])
+
+        return sort_struct
+
+    return None
+
+# _identity(value: object) -> object
+#
+# the sort key for values that Python already orders correctly
+def _identity(value: object) -> object:
+    return value
+
+# _ndarray_bytes(value: numpy.ndarray, dtype: numpy.dtype) -> bytes
+#
+# returns the items of a one-dimensional ndarray converted to a little endian dtype. integers are
+# range checked and floats are checked for overflow, so that a value which does not fit raises
+# rather than being silently wrapped or truncated, as it would be by struct.pack()
+def _ndarray_bytes(value, dtype) -> bytes:
+    if value.ndim != 1:
+        raise ValueError('expected a one-dimensional array, received ' + str(value.ndim) + ' dimensions')
+    elif numpy.can_cast(value.dtype, dtype, 'safe'):
+        return value.astype(dtype, copy=False).tobytes()
+    elif dtype.kind in 'iu' and value.dtype.kind in 'iu':
+        limits = numpy.iinfo(dtype)
+        if value.size and (int(value.min()) < limits.min or int(value.max()) > limits.max):
+            raise ValueError('array values are out of range for \'' + str(dtype) + '\'')
+
+        return value.astype(dtype).tobytes()
+    elif dtype.kind == 'f' and value.dtype.kind in 'iuf':
+        with numpy.errstate(over='ignore'):
+            converted = value.astype(dtype)
+
+        if not numpy.isfinite(converted[numpy.isfinite(value)]).all():
+            raise ValueError('array values are out of range for \'' + str(dtype) + '\'')
+
+        return converted.tobytes()
+
+    raise TypeError('cannot encode an array of \'' + str(value.dtype) + '\' as \'' + str(dtype) + '\' without losing data')
+
+# _compile_encoder(_type: object, use_numpy: bool = False, records: bool = False) -> function
+#
+# walks the type tree once and returns an encoder function for the specified Borsh type. every
+# encoder has the signature encode(value, out: bytearray) and appends its output to 'out'. when
+# records is set, structs are expected to be record class instances rather than 'types.struct'
+def _compile_encoder(_type: object, use_numpy: bool = False, records: bool = False):
+    # first, check for a primitive type that struct can encode for us
+    if _primitive_format(_type) is not None:
+        pack = struct.Struct('<' + _primitive_format(_type)).pack
+
+        def encode_primitive(value, out):
+            out += pack(value)
+
+        return encode_primitive
+    # then, check for the 128 bit integer types
+    elif isinstance(_type, int) and _type in (types.u128, types.i128):
+        signed = _type in type_groups.int_types
+
+        def encode_int128(value, out):
+            out += value.to_bytes(16, 'little', signed=signed)
+
+        return encode_int128
+    # check for a unit type
+    elif _type is types.unit:
+        def encode_unit(value, out):
+            pass
+
+        return encode_unit
+    # check for a byte array
+    elif isinstance(_type, types.bytes):
+        obj_length = _type.length
+
+        def encode_bytes(value, out):
+            # any bytes-like object can be copied in directly. lists of ints are also accepted
+            if not isinstance(value, (bytes, bytearray, memoryview)):
+                value = bytes(value)
+
+            if obj_length is None:
+                out += _u32.pack(len(value))
+            elif len(value) != obj_length:
+                raise ValueError('expected ' + str(obj_length) + ' bytes, received ' + str(len(value)))
+
+            out += value
+
+        return encode_bytes
+    # check for a fixed_array
+    elif isinstance(_type, types.fixed_array):
+        obj_length = _type.length
+
+        item_format = _primitive_format(_type.array_type)
+        if item_format is not None:
+            pack = struct.Struct('<' + str(obj_length) + item_format).pack
+            dtype = numpy.dtype('<' + item_format) if use_numpy else None
+
+            def encode_fixed_primitive_array(value, out):
+                # ndarrays are converted to little endian and copied out in one go
+                if dtype is not None and isinstance(value, numpy.ndarray):
+                    if value.size != obj_length:
+                        raise ValueError('expected ' + str(obj_length) + ' items for fixed_array, received ' + str(value.size))
+
+                    out += _ndarray_bytes(value, dtype)
+                else:
+                    out += pack(*value)
+
+            return encode_fixed_primitive_array
+
+        encode_item = _compile_encoder(_type.array_type, use_numpy, records)
+
+        def encode_fixed_array(value, out):
+            for n in range(obj_length):
+                encode_item(value[n], out)
+
+        return encode_fixed_array
+    # check for a dynamic array
+    elif isinstance(_type, types.dynamic_array):
+        item_format = _primitive_format(_type.array_type)
+        if item_format is not None:
+            dtype = numpy.dtype('<' + item_format) if use_numpy else None
+
+            def encode_dynamic_primitive_array(value, out):
+                # store the length of the array as a u32, followed by all of the items at once
+                if dtype is not None and isinstance(value, numpy.ndarray):
+                    encoded = _ndarray_bytes(value, dtype)
+                    out += _u32.pack(value.size)
+                    out += encoded
+                else:
+                    out += _u32.pack(len(value))
+                    out += struct.pack('<' + str(len(value)) + item_format, *value)
+
+            return encode_dynamic_primitive_array
+
+        encode_item = _compile_encoder(_type.array_type, use_numpy, records)
+
+        def encode_dynamic_array(value, out):
+            # store the length of the array as a u32
+            out += _u32.pack(len(value))
+            for item in value:
+                encode_item(item, out)
+
+        return encode_dynamic_array
+    # check for a hashmap
+    elif isinstance(_type, types.hashmap):
+        encode_key = _compile_encoder(_type.hashmap_key_type, use_numpy, records)
+        encode_value = _compile_encoder(_type.hashmap_value_type, use_numpy, records)
+
+        def encode_hashmap(value, out):
+            # store the length of the map as a u32
+            out += _u32.pack(len(value))
+            for _key in value:
+                encode_key(_key, out)
+                encode_value(value[_key], out)
+
+        return encode_hashmap
+    # check for a hashset
+    elif isinstance(_type, types.hashset):
+        encode_item = _compile_encoder(_type.hashset_type, use_numpy, records)
+        sort_key = _compile_sort_key(_type.hashset_type)
+
+        def encode_hashset(value, out):
+            # store the length of the set as a u32, followed by the sorted items
+            out += _u32.pack(len(value))
+            for item in sorted(value, key=sort_key):
+                encode_item(item, out)
+
+        return encode_hashset
+    # check for a string
+    elif _type is types.string:
+        def encode_string(value, out):
+            # store the length of the encoded string in bytes as a u32, followed by the string
+            encoded = value.encode('utf-8')
+            out += _u32.pack(len(encoded))
+            out += encoded
+
+        return encode_string
+    # check for an option
+    elif isinstance(_type, types.option):
+        encode_inner = _compile_encoder(_type.option_type, use_numpy, records)
+
+        def encode_option(value, out):
+            if value is None:
+                out.append(0)
+            else:
+                out.append(1)
+                encode_inner(value, out)
+
+        return encode_option
+    # check for an enum. the variant is mapped to its tag and payload encoder with one dict lookup
+    elif isinstance(_type, types.enum):
+        variants = {name: (tag, _compile_encoder(payload, use_numpy, records))
+            for tag, (name, payload) in enumerate(_type.variants)}
+
+        def encode_enum(value, out):
+            name, payload = _variant_parts(value)
+            try:
+                tag, encode_payload = variants[name]
+            except KeyError:
+                raise ValueError('unknown enum variant \'' + str(name) + '\'')
+
+            out.append(tag)
+            encode_payload(payload, out)
+
+        return encode_enum
+    # check for a struct
+    elif isinstance(_type, types.struct):
+        if records:
+            return _compile_record_encoder(_type.struct_dict, use_numpy, True)
+
+        encode_record = _compile_record_encoder(_type.struct_dict, use_numpy)
+
+        def encode_struct(value, out):
+            encode_record(value.struct_dict, out)
+
+        return encode_struct
+    else:
+        raise NotImplementedError('serializing \'' + str(_type) + '\' not implemented yet')
+
+# _compile_fields_encoder(schema_def: dict, use_numpy: bool = False, records: bool = False) -> list
+#
+# compiles a list of (key, get_value, encoder) triples for an ordered set of {key: type} pairs.
+# get_value pulls the value to encode out of the data dict. for a run of primitive keys it
+# returns a tuple holding every value in the run. keys for option types may be left out of
+# the data entirely, in which case they are encoded as absent. when records is set, the values
+# are read from the attributes of a record class instance instead
+def _compile_fields_encoder(schema_def: dict, use_numpy: bool = False, records: bool = False) -> list:
+    fields = []
+    for keys in _group_runs(schema_def):
+        key = keys[0]
+        if records and len(keys) > 1:
+            run_struct = _run_struct(schema_def, keys)
+            fields.append((key, operator.attrgetter(*keys), _compile_run_encoder(run_struct)))
+        elif records:
+            fields.append((key, operator.attrgetter(key), _compile_encoder(schema_def[key], use_numpy, True)))
+        elif len(keys) > 1:
+            run_struct = _run_struct(schema_def, keys)
+            fields.append((key, operator.itemgetter(*keys), _compile_run_encoder(run_struct)))
+        elif isinstance(schema_def[key], types.option):
+            fields.append((key, operator.methodcaller('get', key), _compile_encoder(schema_def[key], use_numpy)))
+        else:
+            fields.append((key, operator.itemgetter(key), _compile_encoder(schema_def[key], use_numpy)))
+
+    return fields
+
+# _compile_run_encoder(run_struct: struct.Struct) -> function
+#
+# returns an encoder that packs a whole run of primitive values with a single call
+def _compile_run_encoder(run_struct: struct.Struct):
+    pack = run_struct.pack
+
+    def encode_run(values, out):
+        out += pack(*values)
+
+    return encode_run
+
+# _compile_record_encoder(schema_def: dict, use_numpy: bool = False, records: bool = False) -> function
+#
+# compiles an encoder for an ordered set of {key: type} pairs. when records is set, the encoder
+# takes a record class instance instead of a dict
+def _compile_record_encoder(schema_def: dict, use_numpy: bool = False, records: bool = False):
+    fields = _compile_fields_encoder(schema_def, use_numpy, records)
+
+    def encode_record(data, out):
+        for key, get_value, encode_value in fields:
+            encode_value(get_value(data), out)
+
+    return encode_record
+
+# _fixed_size(_type: object) -> int
+#
+# returns the number of bytes that every value of the specified type encodes to, or None if the
+# size depends on the value
+def _fixed_size(_type: object) -> int:
+    if _primitive_format(_type) is not None:
+        return struct.calcsize('<' + _primitive_format(_type))
+    elif isinstance(_type, int) and _type in (types.u128, types.i128):
+        return 16
+    elif _type is types.unit:
+        return 0
+    elif isinstance(_type, types.bytes):
+        return _type.length
+    elif isinstance(_type, types.fixed_array):
+        item_size = _fixed_size(_type.array_type)
+        if item_size is not None:
+            return item_size * _type.length
+    elif isinstance(_type, types.struct):
+        return _record_fixed_size(_type.struct_dict)
+    elif isinstance(_type, types.enum):
+        # an enum only has a fixed size if every one of its variants has the same one
+        sizes = set(_fixed_size(payload) for name, payload in _type.variants)
+        if len(sizes) == 1 and None not in sizes:
+            return 1 + sizes.pop()
+
+    return None
+
+# _record_fixed_size(schema_def: dict) -> int
+#
+# returns the encoded size of a whole record, or None if any of its keys has a variable size
+def _record_fixed_size(schema_def: dict) -> int:
+    total = 0
+    for key in schema_def:
+        size = _fixed_size(schema_def[key])
+        if size is None:
+            return None
+
+        total += size
+
+    return total
+
+# _min_size(_type: object) -> int
+#
+# returns the smallest number of bytes that a value of the specified type can encode to
+def _min_size(_type: object) -> int:
+    size = _fixed_size(_type)
+    if size is not None:
+        return size
+    elif isinstance(_type, types.option):
+        return 1
+    elif isinstance(_type, types.fixed_array):
+        return _min_size(_type.array_type) * _type.length
+    elif isinstance(_type, types.struct):
+        return sum(_min_size(_type.struct_dict[key]) for key in _type.struct_dict)
+    elif isinstance(_type, types.enum):
+        return 1 + min(_min_size(payload) for name, payload in _type.variants)
+
+    # everything else starts with a u32 length prefix
+    return 4
+
+# _max_size(_type: object) -> int
+#
+# returns the largest number of bytes that a value of the specified type can encode to, or None if
+# there is no upper bound
+def _max_size(_type: object) -> int:
+    size = _fixed_size(_type)
+    if size is not None:
+        return size
+    elif isinstance(_type, types.option):
+        inner_size = _max_size(_type.option_type)
+        return 1 + inner_size if inner_size is not None else None
+    elif isinstance(_type, types.fixed_array):
+        item_size = _max_size(_type.array_type)
+        return item_size * _type.length if item_size is not None else None
+    elif isinstance(_type, types.struct):
+        return _record_max_size(_type.struct_dict)
+    elif isinstance(_type, types.enum):
+        sizes = [_max_size(payload) for name, payload in _type.variants]
+        return 1 + max(sizes) if None not in sizes else None
+
+    return None
+
+# _record_max_size(schema_def: dict) -> int
+#
+# returns the largest encoded size of a whole record, or None if it is unbounded
+def _record_max_size(schema_def: dict) -> int:
+    total = 0
+    for key in schema_def:
+        size = _max_size(schema_def[key])
+        if size is None:
+            return None
+
+        total += size
+
+    return total
+
+# _compile_sizer(_type: object) -> function
+#
+# returns a function that computes the exact number of bytes that a value of the specified type
+# will encode to, without encoding it. every sizer has the signature size(value) -> int
+def _compile_sizer(_type: object):
+    size = _fixed_size(_type)
+    if size is not None:
+        def size_fixed(value):
+            return size
+
+        return size_fixed
+    # check for a string. ascii strings are one byte per character, so they don't need encoding
+    elif _type is types.string:
+        def size_string(value):
+            return 4 + (len(value) if value.isascii() else len(value.encode('utf-8')))
+
+        return size_string
+    # check for a dynamic byte array
+    elif isinstance(_type, types.bytes):
+        def size_bytes(value):
+            return 4 + len(value)
+
+        return size_bytes
+    # check for arrays and sets
+    elif isinstance(_type, (types.dynamic_array, types.hashset, types.fixed_array)):
+        item_type = _type.hashset_type if isinstance(_type, types.hashset) else _type.array_type
+        prefix = 0 if isinstance(_type, types.fixed_array) else 4
+        item_size = _fixed_size(item_type)
+
+        if item_size is not None:
+            def size_fixed_items(value):
+                return prefix + len(value) * item_size
+
+            return size_fixed_items
+
+        size_item = _compile_sizer(item_type)
+
+        def size_items(value):
+            total = prefix
+            for item in value:
+                total += size_item(item)
+
+            return total
+
+        return size_items
+    # check for a hashmap
+    elif isinstance(_type, types.hashmap):
+        size_key = _compile_sizer(_type.hashmap_key_type)
+        size_value = _compile_sizer(_type.hashmap_value_type)
+
+        def size_hashmap(value):
+            total = 4
+            for _key in value:
+                total += size_key(_key) + size_value(value[_key])
+
+            return total
+
+        return size_hashmap
+    # check for an option
+    elif isinstance(_type, types.option):
+        size_inner = _compile_sizer(_type.option_type)
+
+        def size_option(value):
+            return 1 if value is None else 1 + size_inner(value)
+
+        return size_option
+    # check for an enum
+    elif isinstance(_type, types.enum):
+        variants = {name: _compile_sizer(payload) for name, payload in _type.variants}
+
+        def size_enum(value):
+            name, payload = _variant_parts(value)
+            try:
+                return 1 + variants[name](payload)
+            except KeyError:
+                raise ValueError('unknown enum variant \'' + str(name) + '\'')
+
+        return size_enum
+    # check for a struct
+    elif isinstance(_type, types.struct):
+        size_record = _compile_record_sizer(_type.struct_dict)
+
+        def size_struct(value):
+            return size_record(value.struct_dict)
+
+        return size_struct
+    else:
+        raise NotImplementedError('sizing \'' + str(_type) + '\' not implemented yet')
+
+# _compile_record_sizer(schema_def: dict) -> function
+#
+# returns a sizer for a whole record. the fixed-size keys are added up once, ahead of time, so only
+# the variable-size keys are looked at for each record
+def _compile_record_sizer(schema_def: dict):
+    fixed_total = 0
+    fields = []
+    for key in schema_def:
+        size = _fixed_size(schema_def[key])
+        if size is not None:
+            fixed_total += size
+        elif isinstance(schema_def[key], types.option):
+            fields.append((operator.methodcaller('get', key), _compile_sizer(schema_def[key])))
+        else:
+            fields.append((operator.itemgetter(key), _compile_sizer(schema_def[key])))
+
+    def size_record(data):
+        total = fixed_total
+        for get_value, size_value in fields:
+            total += size_value(get_value(data))
+
+        return total
+
+    return size_record
+
+# _compile_skipper(_type: object) -> function
+#
+# returns a function that finds the end of an encoded value of the specified type without decoding
+# it. every skipper has the signature skip(data, position) -> position. values with a fixed size
+# are skipped with a single addition, and collections of fixed-size items with one multiplication
+def _compile_skipper(_type: object):
+    size = _fixed_size(_type)
+    if size is not None:
+        def skip_fixed(data, position):
+            return position + size
+
+        return skip_fixed
+    # check for length-prefixed runs of bytes
+    elif _type is types.string or isinstance(_type, types.bytes):
+        def skip_prefixed(data, position):
+            length, position = _read_u32(data, position)
+            return _check_end(data, position + length)
+
+        return skip_prefixed
+    # check for arrays and sets with a length prefix
+    elif isinstance(_type, (types.dynamic_array, types.hashset)):
+        item_type = _type.array_type if isinstance(_type, types.dynamic_array) else _type.hashset_type
+        item_size = _fixed_size(item_type)
+
+        if item_size is not None:
+            def skip_fixed_items(data, position):
+                obj_length, position = _read_u32(data, position)
+                return _check_end(data, position + obj_length * item_size)
+
+            return skip_fixed_items
+
+        skip_item = _compile_skipper(item_type)
+        item_size = _min_size(item_type)
+
+        def skip_items(data, position):
+            obj_length, position = _read_u32(data, position)
+            _check_count(data, position, obj_length, item_size, None)
+            for n in range(obj_length):
+                position = skip_item(data, position)
+
+            return position
+
+        return skip_items
+    # check for a hashmap
+    elif isinstance(_type, types.hashmap):
+        key_size = _fixed_size(_type.hashmap_key_type)
+        value_size = _fixed_size(_type.hashmap_value_type)
+
+        if key_size is not None and value_size is not None:
+            def skip_fixed_pairs(data, position):
+                length, position = _read_u32(data, position)
+                return _check_end(data, position + length * (key_size + value_size))
+
+            return skip_fixed_pairs
+
+        skip_key = _compile_skipper(_type.hashmap_key_type)
+        skip_value = _compile_skipper(_type.hashmap_value_type)
+        pair_size = _min_size(_type.hashmap_key_type) + _min_size(_type.hashmap_value_type)
+
+        def skip_pairs(data, position):
+            length, position = _read_u32(data, position)
+            _check_count(data, position, length, pair_size, None)
+            for n in range(length):
+                position = skip_value(data, skip_key(data, position))
+
+            return position
+
+        return skip_pairs
+    # check for a fixed_array of variable-size items
+    elif isinstance(_type, types.fixed_array):
+        skip_item = _compile_skipper(_type.array_type)
+        obj_length = _type.length
+
+        def skip_fixed_array(data, position):
+            for n in range(obj_length):
+                position = skip_item(data, position)
+
+            return position
+
+        return skip_fixed_array
+    # check for an option, which is skipped based on its presence byte
+    elif isinstance(_type, types.option):
+        skip_inner = _compile_skipper(_type.option_type)
+
+        def skip_option(data, position):
+            if data[position]:
+                return skip_inner(data, position + 1)
+
+            return position + 1
+
+        return skip_option
+    # check for an enum, which is skipped based on its tag
+    elif isinstance(_type, types.enum):
+        variants = [_compile_skipper(payload) for name, payload in _type.variants]
+        count = len(variants)
+
+        def skip_enum(data, position):
+            tag = data[position]
+            if tag >= count:
+                raise ValueError('invalid enum tag ' + str(tag) + ' (expected less than ' + str(count) + ')')
+
+            return variants[tag](data, position + 1)
+
+        return skip_enum
+    # check for a struct
+    elif isinstance(_type, types.struct):
+        return _compile_record_skipper(_type.struct_dict)
+    else:
+        raise NotImplementedError('skipping \'' + str(_type) + '\' not implemented yet')
+
+# _compile_record_skipper(schema_def: dict) -> function
+#
+# returns a skipper for a whole record. consecutive fixed-size keys are merged into one step
+def _compile_record_skipper(schema_def: dict):
+    steps = []
+    for key in schema_def:
+        size = _fixed_size(schema_def[key])
+        if size is not None and steps and isinstance(steps[-1], int):
+            steps[-1] += size
+        elif size is not None:
+            steps.append(size)
+        else:
+            steps.append(_compile_skipper(schema_def[key]))
+
+    def skip_record(data, position):
+        for step in steps:
+            if step.__class__ is int:
+                position += step
+            else:
+                position = step(data, position)
+
+        return position
+
+    return skip_record
+
+# _check_end(data: bytes, end: int) -> int
+#
+# raises an IndexError if a value would end past the end of the buffer, otherwise returns the end
+def _check_end(data, end: int) -> int:
+    if end > len(data):
+        raise IndexError('out of data')
+
+    return end
+
+# _compile_layout(schema_def: dict, use_numpy: bool = False, strings: _string_table = None, max_collection_len: int = None) -> list
+#
+# compiles a list of (key, offset, decoder, skipper) tuples with a separate decoder and skipper for
+# every key. offset is the position of the key relative to the start of the record if every key
+# before it has a fixed size, and None otherwise
+def _compile_layout(schema_def: dict, use_numpy: bool = False, strings: object = None, max_collection_len: int = None) -> list:
+    layout = []
+    offset = 0
+    for key in schema_def:
+        layout.append((key, offset, _compile_decoder(schema_def[key], use_numpy, None, strings, max_collection_len), _compile_skipper(schema_def[key])))
+
+        size = _fixed_size(schema_def[key])
+        offset = offset + size if offset is not None and size is not None else None
+
+    return layout
+
+# _field_tree(schema_def: dict, fields: iterable) -> dict
+#
+# parses a list of key paths, such as ['owner', 'config.fee_bps'], into a tree of {key: subtree}
+# dicts that follows the nesting of struct types. keys selected in full map to None
+def _field_tree(schema_def: dict, fields: object) -> dict:
+    tree = {}
+    for field in fields:
+        if not isinstance(field, str):
+            raise TypeError('invalid field \'' + str(field) + '\' (expected \'str\')')
+
+        node = tree
+        node_def = schema_def
+        parts = field.split('.')
+        for depth, part in enumerate(parts):
+            if not isinstance(node_def, dict) or part not in node_def:
+                raise KeyError('field \'' + field + '\' is not in the schema')
+
+            # the last part of the path selects the whole value
+            if depth == len(parts) - 1:
+                node[part] = None
+                break
+
+            if not isinstance(node_def[part], types.struct):
+                raise ValueError('field \'' + field + '\' does not refer to a key inside a struct')
+
+            # stop if a parent of this key is already selected in full
+            if part in node and node[part] is None:
+                break
+
+            node = node.setdefault(part, {})
+            node_def = node_def[part].struct_dict
+
+    return tree
+
+# _compile_projection(schema_def: dict, tree: dict, use_numpy: bool, need_end: bool, strings: _string_table = None, max_collection_len: int = None) -> list
+#
+# compiles a list of (key, function, store) steps that decode only the keys selected by a field
+# tree. for stored steps, function is a decoder whose value is stored under key. every other step is
+# a skipper, with consecutive fixed-size keys merged into one. when need_end is not set, the steps
+# stop as soon as the last selected key has been read
+def _compile_projection(schema_def: dict, tree: dict, use_numpy: bool, need_end: bool, strings: object = None, max_collection_len: int = None) -> list:
+    keys = list(schema_def)
+    last = max(keys.index(key) for key in tree) if tree else -1
+    stop = len(keys) if need_end else last + 1
+
+    steps = []
+    pending_key = None
+    pending_size = 0
+    for index in range(stop):
+        key = keys[index]
+        _type = schema_def[key]
+
+        # merge runs of unselected fixed-size keys into a single skip
+        size = _fixed_size(_type) if key not in tree else None
+        if size is not None:
+            if pending_key is None:
+                pending_key = key
+            pending_size += size
+            continue
+
+        if pending_key is not None:
+            steps.append((pending_key, _compile_fixed_skip(pending_size), False))
+            pending_key = None
+            pending_size = 0
+
+        if key not in tree:
+            steps.append((key, _compile_skipper(_type), False))
+        elif tree[key] is None:
+            steps.append((key, _compile_decoder(_type, use_numpy, None, strings, max_collection_len), True))
+        else:
+            # nested structs must be read to their end unless nothing after them is needed
+            sub_steps = _compile_projection(_type.struct_dict, tree[key], use_numpy, need_end or index < stop - 1, strings, max_collection_len)
+            steps.append((key, _compile_projection_decoder(sub_steps), True))
+
+    if pending_key is not None:
+        steps.append((pending_key, _compile_fixed_skip(pending_size), False))
+
+    return steps
+
+# _compile_fixed_skip(size: int) -> function
+#
+# returns a skipper that moves past a fixed number of bytes
+def _compile_fixed_skip(size: int):
+    def skip_fixed(data, position):
+        return position + size
+
+    return skip_fixed
+
+# _compile_projection_decoder(steps: list) -> function
+#
+# returns a decoder for a struct that runs a list of projection steps and wraps the selected keys
+# in a new struct
+def _compile_projection_decoder(steps: list):
+    def decode_projection(data, position):
+        results = {}
+        for key, step, store in steps:
+            if store:
+                results[key], position = step(data, position)
+            else:
+                position = step(data, position)
+
+        return _wrap_struct(results), position
+
+    return decode_projection
+
+# _compile_patcher(schema_def: dict, keys: frozenset, use_numpy: bool = False, encoders: dict = None) -> function
+#
+# returns a function that rewrites the specified keys of an encoded record in place, without
+# decoding or encoding the rest of it. keys at a fixed offset are found directly, and the other keys
+# are found by skipping over the keys before them. a key whose encoded size changes is spliced in,
+# which is only possible when the buffer is a bytearray. every key is encoded and checked before any
+# of them is written, so a patch that fails leaves the record untouched. encoders may map keys to
+# the encoders to use in place of compiled ones. the function has the signature
+# patch_record(buffer, values, position) -> None
+def _compile_patcher(schema_def: dict, keys: frozenset, use_numpy: bool = False, encoders: dict = None):
+    last = max(list(schema_def).index(key) for key in keys)
+
+    steps = []
+    offset = 0
+    for key in list(schema_def)[:last + 1]:
+        _type = schema_def[key]
+        size = _fixed_size(_type)
+        format_char = _primitive_format(_type) if key in keys and encoders is None else None
+
+        if key not in keys:
+            encode_value = None
+        elif encoders is not None:
+            encode_value = encoders[key]
+        elif format_char is None:
+            encode_value = _compile_encoder(_type, use_numpy)
+        else:
+            encode_value = None
+
+        steps.append((
+            key,
+            offset,
+            size,
+            struct.Struct('<' + format_char).pack if format_char is not None else None,
+            encode_value,
+            _compile_skipper(_type) if size is None else None
+        ))
+
+        offset = offset + size if offset is not None and size is not None else None
+
+    def patch_record(buffer, values, position):
+        base = position
+        writes = []
+        for key, field_offset, size, pack, encode_value, skip in steps:
+            if field_offset is not None:
+                position = base + field_offset
+
+            try:
+                end = _check_end(buffer, position + size) if size is not None else skip(buffer, position)
+            except (IndexError, struct.error):
+                raise IndexError('out of data while patching record')
+
+            if pack is not None:
+                writes.append((position, end, pack(values[key])))
+            elif encode_value is not None:
+                encoded = bytearray()
+                encode_value(values[key], encoded)
+
+                if len(encoded) != end - position and buffer.__class__ is not bytearray:
+                    raise ValueError('cannot resize key \'' + str(key) + '\' from ' + str(end - position) + ' to ' +
+                        str(len(encoded)) + ' bytes in a buffer that cannot be resized (expected \'bytearray\')')
+
+                writes.append((position, end, encoded))
+
+            position = end
+
+        # splice from the last key back, so that resizing a key does not move the ones before it
+        for position, end, encoded in reversed(writes):
+            buffer[position : end] = encoded
+
+    return patch_record
+
+# _numpy_dtype(_type: object) -> numpy.dtype
+#
+# returns a numpy dtype with the same memory layout as the Borsh encoding of the specified type,
+# or None if the type has no fixed size or cannot be represented. fixed length byte arrays map to
+# void ('V') fields, since numpy's 'S' type strips trailing null bytes
+def _numpy_dtype(_type: object):
+    if _primitive_format(_type) is not None:
+        return numpy.dtype('<' + _primitive_format(_type))
+    elif isinstance(_type, types.bytes) and _type.length is not None:
+        return numpy.dtype('V' + str(_type.length))
+    elif isinstance(_type, types.fixed_array):
+        item_dtype = _numpy_dtype(_type.array_type)
+        if item_dtype is not None:
+            return numpy.dtype((item_dtype, (_type.length,)))
+
+    return None
+
+# _record_numpy_dtype(schema_def: dict) -> numpy.dtype
+#
+# returns a packed numpy structured dtype matching the layout of a whole record, or None if any of
+# its keys cannot be represented
+def _record_numpy_dtype(schema_def: dict):
+    fields = []
+    for key in schema_def:
+        field_dtype = _numpy_dtype(schema_def[key])
+        if field_dtype is None:
+            return None
+
+        fields.append((key, field_dtype))
+
+    if not fields:
+        return None
+
+    return numpy.dtype(fields)
+
+# class codec
+#
+# a precompiled set of decoders and encoders for the keys of a schema. type dispatch happens
+# once, when the codec is built, rather than once per value. when use_numpy is set, arrays of
+# numeric types are decoded into numpy arrays and ndarrays are accepted when encoding. not
+# intended to be directly instantiated by user code; use 'schema.compile()' instead
+class codec:
+    decoders = None
+    encoders = None
+    use_numpy = False
+
+    # the column type for each key when decoding columns: a struct format character for primitive
+    # keys and None for any other key
+    column_formats = None
+
+    # a single struct covering the whole record when every key is a primitive, otherwise None
+    record_struct = None
+
+    # the number of bytes that every record encodes to, or None if it depends on the data
+    fixed_size = None
+
+    # a numpy structured dtype covering the whole record when use_numpy is set and the record has a
+    # fixed layout that numpy can represent, otherwise None
+    record_dtype = None
+
+    # the position of every key in the schema
+    key_index = None
+
+    # the smallest and largest number of bytes that a record can encode to. max_size is None if
+    # there is no upper bound
+    min_size = None
+    max_size = None
+
+    # the table of interned strings shared by every decoder of the codec, or None
+    strings = None
+
+    # the limits on untrusted input: the most items that a dynamic array, hashmap or hashset may
+    # have, and the most bytes that a whole record may span. None means no limit
+    max_collection_len = None
+    max_total_bytes = None
+
+    schema_def = None
+    _layout = None
+    _sizer = None
+    _projections = None
+    _record_decoders = None
+    _record_encoder = None
+    _patchers = None
+
+    def __init__(self, schema_def: dict, use_numpy: bool = False, intern_strings: int = 0,
+        max_collection_len: int = None, max_total_bytes: int = None):
+        if use_numpy and numpy is None:
+            raise ImportError('use_numpy=True requires the \'numpy\' package to be installed')
+
+        self.max_collection_len = max_collection_len
+        self.max_total_bytes = max_total_bytes
+
+        if intern_strings:
+            self.strings = _string_table(intern_strings)
+
+        self.decoders = _compile_fields_decoder(schema_def, use_numpy, False, self.strings, self.max_collection_len)
+        self.encoders = _compile_fields_encoder(schema_def, use_numpy)
+        self.schema_def = schema_def
+        self.key_index = {key: index for index, key in enumerate(schema_def)}
+        self.use_numpy = use_numpy
+        self.fixed_size = _record_fixed_size(schema_def)
+        self.min_size = sum(_min_size(schema_def[key]) for key in schema_def)
+        self.max_size = _record_max_size(schema_def)
+
+        self.column_formats = {key: _primitive_format(schema_def[key]) for key in schema_def}
+        if self.column_formats and None not in self.column_formats.values():
+            self.record_struct = _run_struct(schema_def, list(schema_def))
+        if use_numpy:
+            self.record_dtype = _record_numpy_dtype(schema_def)
+
+    # layout() -> list
+    #
+    # returns the per-key layout of the record (see _compile_layout()). it is only needed for
+    # random access to single keys, so it is compiled the first time that it is requested
+    def layout(self) -> list:
+        if self._layout is None:
+            self._layout = _compile_layout(self.schema_def, self.use_numpy, self.strings, self.max_collection_len)
+
+        return self._layout
+
+    # sizer() -> function
+    #
+    # returns the record sizer (see _compile_record_sizer()), compiling it on first use
+    def sizer(self):
+        if self._sizer is None:
+            self._sizer = _compile_record_sizer(self.schema_def)
+
+        return self._sizer
+
+    # projection(fields: iterable, need_end: bool) -> list
+    #
+    # returns the projection steps (see _compile_projection()) that read only the specified key
+    # paths. the steps are compiled once for each distinct set of fields and then cached
+    def projection(self, fields: object, need_end: bool) -> list:
+        if self._projections is None:
+            self._projections = {}
+
+        cache_key = (frozenset(fields), need_end)
+        if cache_key not in self._projections:
+            tree = _field_tree(self.schema_def, cache_key[0])
+            self._projections[cache_key] = _compile_projection(self.schema_def, tree, self.use_numpy, need_end, self.strings, self.max_collection_len)
+
+        return self._projections[cache_key]
+
+    # record_decoder(name: str) -> function
+    #
+    # returns a record decoder (see _compile_record_class_decoder()) for the whole record, with a
+    # generated class of the specified name. decoders are compiled once for each name
+    def record_decoder(self, name: str):
+        if self._record_decoders is None:
+            self._record_decoders = {}
+
+        if name not in self._record_decoders:
+            self._record_decoders[name] = _compile_record_class_decoder(self.schema_def, name, self.use_numpy, self.strings, self.max_collection_len)
+
+        return self._record_decoders[name]
+
+    # patcher(keys: iterable) -> function
+    #
+    # returns the patcher (see _compile_patcher()) that rewrites the specified keys in place. the
+    # patchers are compiled once for each distinct set of keys and then cached
+    def patcher(self, keys: object):
+        if self._patchers is None:
+            self._patchers = {}
+
+        cache_key = frozenset(keys)
+        if cache_key not in self._patchers:
+            for key in cache_key:
+                if key not in self.key_index:
+                    raise KeyError('key \'' + str(key) + '\' is not in the schema')
+
+            self._patchers[cache_key] = _compile_patcher(self.schema_def, cache_key, self.use_numpy)
+
+        return self._patchers[cache_key]
+
+    # record_encoder() -> function
+    #
+    # returns an encoder for record class instances, compiling it on first use
+    def record_encoder(self):
+        if self._record_encoder is None:
+            self._record_encoder = _compile_record_encoder(self.schema_def, self.use_numpy, True)
+
+        return self._record_encoder
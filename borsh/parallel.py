@@ -0,0 +1,114 @@
+import atexit               # register
+import concurrent.futures   # ProcessPoolExecutor
+import os                   # cpu_count
+from multiprocessing import shared_memory
+from . import _get_codec, _deserialize_at, deserialize_many as _deserialize_many
+
+# the state of a worker process: the shared memory block holding the source buffer and the compiled
+# codec. both are set up once per worker by _init_worker()
+_worker_state = {}
+
+# _attach(name: str) -> shared_memory.SharedMemory
+#
+# attaches to an existing shared memory block without making this process responsible for
+# unlinking it. the process that created the block is the one that cleans it up
+def _attach(name: str) -> shared_memory.SharedMemory:
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # before python 3.13 attaching always registers the block with the resource tracker. the
+        # workers share the tracker of the process that created the block, which already has it
+        # registered, so this is harmless as long as the workers never unregister it themselves
+        return shared_memory.SharedMemory(name=name)
+
+# _init_worker(shm_name: str, length: int, schema: schema) -> None
+#
+# runs once in every worker process. the schema is sent, and compiled, only once per worker
+def _init_worker(shm_name: str, length: int, schema: object) -> None:
+    shm = _attach(shm_name)
+    _worker_state['shm'] = shm
+    _worker_state['data'] = shm.buf[:length]
+    _worker_state['codec'] = _get_codec(schema)
+    atexit.register(_release_worker)
+
+# _release_worker() -> None
+#
+# runs when a worker process exits. the view of the shared buffer has to be released before the
+# block is closed, or closing it fails when the block is garbage collected at shutdown. it is kept
+# until then, rather than being released after each chunk, because numpy arrays decoded from it may
+# still be alive until their chunk has been sent back
+def _release_worker() -> None:
+    data = _worker_state.pop('data', None)
+    if data is not None:
+        data.release()
+
+    shm = _worker_state.pop('shm', None)
+    if shm is not None:
+        shm.close()
+
+# _decode_chunk(offsets: list, columnar: bool) -> object
+#
+# decodes the records at the specified offsets of the shared buffer
+def _decode_chunk(offsets: list, columnar: bool) -> object:
+    data = _worker_state['data']
+    _codec = _worker_state['codec']
+
+    if columnar:
+        return _deserialize_many(_codec, (data[offset:] for offset in offsets), columnar=True)
+
+    return [_deserialize_at(_codec, data, offset)[0] for offset in offsets]
+
+# deserialize_many(schema: schema, buffer: object, offsets: list, workers: int = None, ...) -> list
+#
+# decodes the records starting at each of the specified offsets of a single buffer across a pool of
+# worker processes. the buffer is copied into shared memory once, rather than being pickled to the
+# workers, and may also be passed in as an existing multiprocessing.shared_memory.SharedMemory block
+# to avoid that copy. the offsets are split into chunks of chunk_size (by default, about four chunks
+# per worker) and the results are returned in the same order as the offsets. when columnar is set,
+# one columnar dict (see borsh.deserialize_many()) is returned per chunk instead of a list of records.
+#
+# values are pickled on their way back from the workers, so schemas using 'types.bytes' with
+# zero_copy=True cannot be decoded this way
+def deserialize_many(schema: object, buffer: object, offsets: list, workers: int = None, chunk_size: int = None,
+    columnar: bool = False) -> list:
+    offsets = list(offsets)
+    if not offsets:
+        return []
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if chunk_size is None:
+        chunk_size = max(1, -(-len(offsets) // (workers * 4)))
+
+    chunks = [offsets[n : n + chunk_size] for n in range(0, len(offsets), chunk_size)]
+
+    # copy the source buffer into shared memory, unless it is already there
+    owned = not isinstance(buffer, shared_memory.SharedMemory)
+    if owned:
+        view = memoryview(buffer).cast('B')
+        length = len(view)
+        shm = shared_memory.SharedMemory(create=True, size=max(length, 1))
+        shm.buf[:length] = view
+        view.release()
+    else:
+        shm = buffer
+        length = shm.size
+
+    try:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+            initargs=(shm.name, length, schema)) as executor:
+            results = list(executor.map(_decode_chunk, chunks, [columnar] * len(chunks)))
+    finally:
+        if owned:
+            shm.close()
+            shm.unlink()
+
+    if columnar:
+        return results
+
+    # flatten the chunks back into a single list of records
+    records = []
+    for chunk in results:
+        records.extend(chunk)
+
+    return records
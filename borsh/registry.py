@@ -0,0 +1,146 @@
+import hashlib  # sha256
+from . import _get_codec, _as_buffer, _deserialize_at, _serialize_append, deserialize_many
+
+# anchor_discriminator(name: str, namespace: str = 'account') -> bytes
+#
+# returns the 8 byte discriminator that Anchor programs prefix their accounts ('account') and
+# instructions ('global') with: the first 8 bytes of the sha256 hash of '<namespace>:<name>'
+def anchor_discriminator(name: str, namespace: str = 'account') -> bytes:
+    return hashlib.sha256((namespace + ':' + name).encode('utf-8')).digest()[:8]
+
+# class Registry
+#
+# routes records to one of many schemas by a fixed-length prefix, such as Anchor's 8 byte
+# discriminator or a u8 tag. every prefix in a registry has the same length, so finding the schema
+# for a record is a single dict lookup. the prefix is not part of the schema: decoding starts just
+# after it, and serialize() writes it in front of the encoded data
+class Registry:
+    prefix_length = None
+
+    # {prefix: (name, codec)} and {name: (prefix, codec)}
+    _by_prefix = None
+    _by_name = None
+
+    def __init__(self, prefix_length: int = None):
+        if prefix_length is not None and (not isinstance(prefix_length, int) or prefix_length <= 0):
+            raise ValueError('invalid prefix_length \'' + str(prefix_length) + '\'')
+
+        self.prefix_length = prefix_length
+        self._by_prefix = {}
+        self._by_name = {}
+
+    # register(name: str, schema: schema, prefix: bytes) -> None
+    #
+    # registers a schema under a name and a prefix. an int prefix is taken to be a u8 tag. the
+    # first prefix registered sets the prefix length, unless it was given to the constructor
+    def register(self, name: str, schema: object, prefix: bytes) -> None:
+        if isinstance(prefix, int):
+            prefix = bytes((prefix,))
+        elif isinstance(prefix, (bytearray, memoryview)):
+            prefix = bytes(prefix)
+        elif not isinstance(prefix, bytes):
+            raise TypeError('invalid prefix type \'' + str(prefix.__class__.__name__) + '\' (expected \'bytes\' or \'int\')')
+
+        if self.prefix_length is None:
+            if not prefix:
+                raise ValueError('prefix must not be empty')
+            self.prefix_length = len(prefix)
+        elif len(prefix) != self.prefix_length:
+            raise ValueError('expected a prefix of ' + str(self.prefix_length) + ' bytes, received ' + str(len(prefix)))
+
+        if prefix in self._by_prefix:
+            raise ValueError('prefix ' + prefix.hex() + ' is already registered to \'' + str(self._by_prefix[prefix][0]) + '\'')
+        elif name in self._by_name:
+            raise ValueError('a schema named \'' + str(name) + '\' is already registered')
+
+        _codec = _get_codec(schema)
+        self._by_prefix[prefix] = (name, _codec)
+        self._by_name[name] = (prefix, _codec)
+
+    # _route(data: object, position: int) -> (str, codec)
+    #
+    # looks up the schema for the record starting at the specified position
+    def _route(self, data: object, position: int) -> (str, object):
+        if self.prefix_length is None:
+            raise KeyError('no schemas are registered')
+
+        prefix = bytes(data[position : position + self.prefix_length])
+        try:
+            return self._by_prefix[prefix]
+        except KeyError:
+            if len(prefix) < self.prefix_length:
+                raise IndexError('out of data while reading prefix')
+
+            raise KeyError('no schema is registered for prefix ' + prefix.hex())
+
+    # deserialize(data: bytes) -> (str, dict)
+    #
+    # decodes a prefixed record and returns the name of its schema along with the decoded value
+    def deserialize(self, data: bytes) -> (str, dict):
+        data = _as_buffer(data, 'deserialize')
+        name, _codec = self._route(data, 0)
+        return name, _deserialize_at(_codec, data, self.prefix_length)[0]
+
+    # deserialize_from(buffer: object, offset: int = 0) -> (str, dict, int)
+    #
+    # decodes a prefixed record from any object supporting the buffer protocol starting at the
+    # specified offset, and returns the name of its schema, the decoded value and the offset just
+    # past the record, so that a buffer of mixed records can be walked
+    def deserialize_from(self, buffer: object, offset: int = 0) -> (str, dict, int):
+        data = _as_buffer(buffer, 'deserialize_from')
+        name, _codec = self._route(data, offset)
+        value, end = _deserialize_at(_codec, data, offset + self.prefix_length)
+        return name, value, end
+
+    # group(buffers: iterable) -> dict
+    #
+    # sorts a batch of prefixed records by schema and returns {name: [payload, ...]}, where every
+    # payload is a view of a record just past its prefix. records keep their order within a group
+    def group(self, buffers: object) -> dict:
+        groups = {}
+        for buffer in buffers:
+            data = memoryview(_as_buffer(buffer, 'group'))
+            name = self._route(data, 0)[0]
+            groups.setdefault(name, []).append(data[self.prefix_length:])
+
+        return groups
+
+    # deserialize_many(buffers: iterable, columnar: bool = False) -> dict
+    #
+    # decodes a batch of prefixed records, one per buffer. records are grouped by schema and each
+    # group is decoded with borsh.deserialize_many(), so that columnar decoding can use its fast
+    # paths. returns {name: records} where records is what borsh.deserialize_many() returns
+    def deserialize_many(self, buffers: object, columnar: bool = False) -> dict:
+        return {name: deserialize_many(self._by_name[name][1], payloads, columnar)
+            for name, payloads in self.group(buffers).items()}
+
+    # serialize(name: str, data: dict) -> bytes
+    #
+    # serializes a value with the named schema and returns it with the schema's prefix in front
+    def serialize(self, name: str, data: dict) -> bytes:
+        try:
+            prefix, _codec = self._by_name[name]
+        except KeyError:
+            raise KeyError('no schema named \'' + str(name) + '\' is registered')
+
+        results = bytearray(prefix)
+        _serialize_append(_codec, data, results)
+        return bytes(results)
+
+    # schema(name: str) -> codec
+    #
+    # returns the compiled schema registered under a name
+    def schema(self, name: str) -> object:
+        return self._by_name[name][1]
+
+    def names(self) -> list:
+        return list(self._by_name)
+
+    def __contains__(self, name):
+        return name in self._by_name
+
+    def __len__(self):
+        return len(self._by_name)
+
+    def __repr__(self):
+        return 'Registry(' + ', '.join(repr(name) for name in self._by_name) + ')'
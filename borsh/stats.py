@@ -0,0 +1,332 @@
+import operator # itemgetter, methodcaller
+import time     # perf_counter
+from .types import types, _wrap_struct
+from .compiler import codec, _compile_decoder, _compile_encoder, _compile_patcher, _field_tree, _record_class, _record_class_name
+
+# _type_name(_type: object) -> str
+#
+# returns the name of a Borsh type as it appears in the 'types' namespace, such as 'u64' or
+# 'dynamic_array'
+def _type_name(_type: object) -> str:
+    for name, value in vars(types).items():
+        if name.startswith('_'):
+            continue
+        elif isinstance(_type, int) and isinstance(value, int) and _type == value:
+            return name
+        elif _type is value or (isinstance(value, type) and isinstance(_type, value)):
+            return name
+
+    return str(_type)
+
+# class stats
+#
+# call counts, bytes and cumulative time collected from the schemas it is enabled on, kept per key
+# path (such as 'config.fee_bps') and operation ('decode' or 'encode'). the time and bytes of a
+# struct include those of the keys inside it. see 'schema.enable_stats()'
+class stats:
+    # {(operation, path): [type name, calls, bytes, seconds]}
+    _fields = None
+
+    def __init__(self):
+        self._fields = {}
+
+    # _entry(operation: str, path: str, type_name: str) -> list
+    #
+    # returns the mutable counters for a key path, creating them if needed. the instrumented
+    # codecs hold on to these lists so that recording a call is a few additions
+    def _entry(self, operation: str, path: str, type_name: str) -> list:
+        return self._fields.setdefault((operation, path), [type_name, 0, 0, 0.0])
+
+    # fields() -> dict
+    #
+    # returns {(operation, path): {'type', 'calls', 'bytes', 'seconds'}} for every key path
+    def fields(self) -> dict:
+        return {
+            field: {'type': type_name, 'calls': calls, 'bytes': size, 'seconds': seconds}
+            for field, (type_name, calls, size, seconds) in self._fields.items()
+        }
+
+    # types() -> dict
+    #
+    # returns {(operation, type name): {'calls', 'bytes', 'seconds'}}, summed over every key path
+    # of that type
+    def types(self) -> dict:
+        totals = {}
+        for (operation, path), (type_name, calls, size, seconds) in self._fields.items():
+            total = totals.setdefault((operation, type_name), {'calls': 0, 'bytes': 0, 'seconds': 0.0})
+            total['calls'] += calls
+            total['bytes'] += size
+            total['seconds'] += seconds
+
+        return totals
+
+    # as_prometheus(prefix: str = 'borsh') -> dict
+    #
+    # returns the counters as {metric name: [(labels, value), ...]}, ready to be set on Prometheus
+    # counters or written out in the text exposition format
+    def as_prometheus(self, prefix: str = 'borsh') -> dict:
+        metrics = {}
+        for kind, totals in (('field', self.fields()), ('type', self.types())):
+            for name in ('calls', 'bytes', 'seconds'):
+                samples = metrics.setdefault(prefix + '_' + kind + '_' + name + '_total', [])
+                for label_values, total in totals.items():
+                    if kind == 'field':
+                        labels = {'operation': label_values[0], 'path': label_values[1], 'type': total['type']}
+                    else:
+                        labels = {'operation': label_values[0], 'type': label_values[1]}
+
+                    samples.append((labels, total[name]))
+
+        return metrics
+
+    def reset(self) -> None:
+        self._fields.clear()
+
+    def __repr__(self):
+        return 'stats(' + str(len(self._fields)) + ' fields)'
+
+# _instrument_decoder(_type: object, path: str, _stats: stats, use_numpy: bool, strings: _string_table = None, ...) -> function
+#
+# compiles a decoder that records every call under the key path. the keys of structs are
+# instrumented as well, each under its own dotted path. when record_name is set, structs are
+# decoded into record classes, as they are by _compile_record_class_decoder()
+def _instrument_decoder(_type: object, path: str, _stats: stats, use_numpy: bool, strings: object = None,
+    max_collection_len: int = None, record_name: str = None):
+    if isinstance(_type, types.struct) and record_name is not None:
+        fields = [_instrument_decoder(_type.struct_dict[key], path + '.' + key, _stats, use_numpy, strings,
+            max_collection_len, _record_class_name(key)) for key in _type.struct_dict]
+        record_class = _record_class(_type.struct_dict, record_name)
+        new = tuple.__new__
+
+        def decode_value(data, position):
+            values = []
+            for decode_field in fields:
+                value, position = decode_field(data, position)
+                values.append(value)
+
+            return new(record_class, values), position
+    elif isinstance(_type, types.struct):
+        fields = [(key, _instrument_decoder(_type.struct_dict[key], path + '.' + key, _stats, use_numpy, strings, max_collection_len))
+            for key in _type.struct_dict]
+
+        def decode_value(data, position):
+            struct_data = {}
+            for key, decode_field in fields:
+                struct_data[key], position = decode_field(data, position)
+
+            return _wrap_struct(struct_data), position
+    else:
+        decode_value = _compile_decoder(_type, use_numpy, record_name, strings, max_collection_len)
+
+    return _timed_decoder(decode_value, _stats._entry('decode', path, _type_name(_type)))
+
+# _timed_decoder(decode_value: function, entry: list) -> function
+#
+# wraps a decoder so that every call is recorded into the counters of a key path
+def _timed_decoder(decode_value, entry: list):
+    clock = time.perf_counter
+
+    def decode_instrumented(data, position):
+        start = clock()
+        value, end = decode_value(data, position)
+        entry[3] += clock() - start
+        entry[1] += 1
+        entry[2] += end - position
+
+        return value, end
+
+    return decode_instrumented
+
+# _instrument_encoder(_type: object, path: str, _stats: stats, use_numpy: bool, records: bool = False) -> function
+#
+# compiles an encoder that records every call under the key path (see _instrument_decoder()). when
+# records is set, structs are read from record class instances
+def _instrument_encoder(_type: object, path: str, _stats: stats, use_numpy: bool, records: bool = False):
+    if isinstance(_type, types.struct):
+        fields = [(_instrument_getter(_type.struct_dict, key, records),
+            _instrument_encoder(_type.struct_dict[key], path + '.' + key, _stats, use_numpy, records))
+            for key in _type.struct_dict]
+
+        def encode_value(value, out):
+            struct_data = value if records else value.struct_dict
+            for get_value, encode_field in fields:
+                encode_field(get_value(struct_data), out)
+    else:
+        encode_value = _compile_encoder(_type, use_numpy, records)
+
+    entry = _stats._entry('encode', path, _type_name(_type))
+    clock = time.perf_counter
+
+    # serialize_to() hands its buffer to the sink part way through encoding, so the bytes that it
+    # has already flushed are counted as well
+    def encode_instrumented(value, out):
+        start = clock()
+        size = len(out) if out.__class__ is bytearray else len(out) + out.flushed
+        encode_value(value, out)
+        entry[3] += clock() - start
+        entry[1] += 1
+        entry[2] += (len(out) if out.__class__ is bytearray else len(out) + out.flushed) - size
+
+    return encode_instrumented
+
+# _instrument_getter(schema_def: dict, key: str, records: bool = False) -> function
+#
+# returns the function that pulls a key out of a record when encoding. keys for option types may be
+# left out, as they may be for the uninstrumented encoders. when records is set, the key is read
+# from an attribute of a record class instance instead
+def _instrument_getter(schema_def: dict, key: str, records: bool = False):
+    if records:
+        return operator.attrgetter(key)
+    elif isinstance(schema_def[key], types.option):
+        return operator.methodcaller('get', key)
+
+    return operator.itemgetter(key)
+
+# class _instrumented_codec
+#
+# a codec whose decoders and encoders record into a stats object. every key gets its own decoder
+# and encoder rather than being merged into runs, and the whole-record fast paths are turned off,
+# so that every value is accounted for under its own key. the layouts used by lazy views, the
+# projections used by 'fields', record class decoding and encoding, and patch() are all built from
+# instrumented parts as well
+class _instrumented_codec(codec):
+    _stats = None
+
+    # {key: instrumented decoder}
+    _key_decoders = None
+
+    def __init__(self, schema_def: dict, _stats: stats, use_numpy: bool = False, intern_strings: int = 0,
+        max_collection_len: int = None, max_total_bytes: int = None):
+        super().__init__(schema_def, use_numpy, intern_strings, max_collection_len, max_total_bytes)
+        self._stats = _stats
+        self._key_decoders = {key: _instrument_decoder(schema_def[key], key, _stats, use_numpy, self.strings, max_collection_len)
+            for key in schema_def}
+
+        self.decoders = [(key, None, self._key_decoders[key]) for key in schema_def]
+        self.encoders = [(key, _instrument_getter(schema_def, key), _instrument_encoder(schema_def[key], key, _stats, use_numpy))
+            for key in schema_def]
+        self.record_struct = None
+        self.record_dtype = None
+
+    # layout() -> list
+    #
+    # returns the per-key layout of the record with every decoder instrumented
+    def layout(self) -> list:
+        if self._layout is None:
+            self._layout = [(key, offset, self._key_decoders[key], skip_value)
+                for key, offset, decode_value, skip_value in codec.layout(self)]
+
+        return self._layout
+
+    # projection(fields: iterable, need_end: bool) -> list
+    #
+    # returns the projection steps for the specified key paths. keys selected in full use their
+    # instrumented decoders. structs that are only partly selected are recorded as a whole under
+    # their own key, and skipped keys are not recorded at all
+    def projection(self, fields: object, need_end: bool) -> list:
+        if self._projections is None:
+            self._projections = {}
+
+        cache_key = (frozenset(fields), need_end)
+        if cache_key in self._projections:
+            return self._projections[cache_key]
+
+        tree = _field_tree(self.schema_def, cache_key[0])
+        steps = []
+        for key, step, store in codec.projection(self, fields, need_end):
+            if store and tree[key] is None:
+                step = self._key_decoders[key]
+            elif store:
+                step = _timed_decoder(step, self._stats._entry('decode', key, _type_name(self.schema_def[key])))
+
+            steps.append((key, step, store))
+
+        self._projections[cache_key] = steps
+        return steps
+
+    # record_decoder(name: str) -> function
+    #
+    # returns an instrumented decoder for record class instances with the specified class name
+    def record_decoder(self, name: str):
+        if self._record_decoders is None:
+            self._record_decoders = {}
+
+        if name not in self._record_decoders:
+            fields = [_instrument_decoder(self.schema_def[key], key, self._stats, self.use_numpy, self.strings,
+                self.max_collection_len, _record_class_name(key)) for key in self.schema_def]
+            record_class = _record_class(self.schema_def, name)
+            new = tuple.__new__
+
+            def decode_record(data, position):
+                values = []
+                for decode_field in fields:
+                    value, position = decode_field(data, position)
+                    values.append(value)
+
+                return new(record_class, values), position
+
+            decode_record.record_class = record_class
+            self._record_decoders[name] = decode_record
+
+        return self._record_decoders[name]
+
+    # record_encoder() -> function
+    #
+    # returns an instrumented encoder for record class instances
+    def record_encoder(self):
+        if self._record_encoder is None:
+            fields = [(operator.attrgetter(key), _instrument_encoder(self.schema_def[key], key, self._stats, self.use_numpy, True))
+                for key in self.schema_def]
+
+            def encode_record(data, out):
+                for get_value, encode_value in fields:
+                    encode_value(get_value(data), out)
+
+            self._record_encoder = encode_record
+
+        return self._record_encoder
+
+    # patcher(keys: iterable) -> function
+    #
+    # returns a patcher that encodes every patched key with an instrumented encoder, so that each
+    # one is recorded as an encode of its key
+    def patcher(self, keys: object):
+        if self._patchers is None:
+            self._patchers = {}
+
+        cache_key = frozenset(keys)
+        if cache_key not in self._patchers:
+            for key in cache_key:
+                if key not in self.key_index:
+                    raise KeyError('key \'' + str(key) + '\' is not in the schema')
+
+            encoders = {key: _instrument_encoder(self.schema_def[key], key, self._stats, self.use_numpy) for key in cache_key}
+            self._patchers[cache_key] = _compile_patcher(self.schema_def, cache_key, self.use_numpy, encoders)
+
+        return self._patchers[cache_key]
+
+# class profile
+#
+# a context manager that enables stats on a set of schemas for the duration of a block and then
+# turns them off again:
+#
+#   with borsh.profile(account_schema) as p:
+#       ...
+#   print(p.fields())
+#
+class profile(stats):
+    _schemas = None
+
+    def __init__(self, *schemas):
+        super().__init__()
+        self._schemas = schemas
+
+    def __enter__(self):
+        for _schema in self._schemas:
+            _schema.enable_stats(self)
+
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        for _schema in self._schemas:
+            _schema.disable_stats()
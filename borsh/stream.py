@@ -0,0 +1,219 @@
+import struct   # Struct
+from . import _get_codec, _deserialize_at, _serialize_append
+
+# the framings supported by iter_records() and RecordWriter
+_framings = ('concatenated', 'u32_length_prefixed')
+
+# the u32 length prefix used by the 'u32_length_prefixed' framing
+_u32 = struct.Struct('<I')
+
+# _check_framing(framing: str) -> None
+#
+# raises a ValueError for an unknown framing
+def _check_framing(framing: str) -> None:
+    if framing not in _framings:
+        raise ValueError('invalid framing \'' + str(framing) + '\' (expected one of ' + ', '.join(_framings) + ')')
+
+# _check_frame_length(_codec: codec, length: int) -> None
+#
+# raises a ValueError if a frame's length prefix is over the schema's max_total_bytes. this is
+# checked before the frame is read, so that a hostile prefix cannot make the reader buffer it
+def _check_frame_length(_codec: object, length: int) -> None:
+    if _codec.max_total_bytes is not None and length > _codec.max_total_bytes:
+        raise ValueError('record of ' + str(length) + ' bytes is over max_total_bytes (' + str(_codec.max_total_bytes) + ')')
+
+# _decode_frame(_codec: codec, frame: bytes) -> dict
+#
+# decodes the record held by a frame, raising a ValueError if it does not fill the whole frame
+def _decode_frame(_codec: object, frame: bytes) -> dict:
+    record, end = _deserialize_at(_codec, frame, 0)
+    if end != len(frame):
+        raise ValueError('record of ' + str(end) + ' bytes does not fill its frame of ' + str(len(frame)) + ' bytes')
+
+    return record
+
+# class _stream_buffer
+#
+# the internal class holding the unread part of a stream. data is read from the underlying object
+# in chunks, and only when more is needed. the buffer is kept as a bytes object so that values
+# decoded from it never pin a resizable buffer
+class _stream_buffer:
+    read = None
+    chunk_size = None
+    data = b''
+    position = 0
+    eof = False
+
+    def __init__(self, fileobj: object, chunk_size: int):
+        if not isinstance(chunk_size, int) or chunk_size <= 0:
+            raise ValueError('invalid chunk_size \'' + str(chunk_size) + '\'')
+
+        # accept file-like objects as well as sockets
+        self.read = getattr(fileobj, 'read', None) or getattr(fileobj, 'recv', None)
+        if self.read is None:
+            raise TypeError('expected a file-like object or socket, not \'' + str(fileobj.__class__.__name__) + '\'')
+
+        self.chunk_size = chunk_size
+
+    def available(self) -> int:
+        return len(self.data) - self.position
+
+    # fill(size: int) -> bool
+    #
+    # reads until at least 'size' bytes are available, dropping the bytes that have already been
+    # consumed. the chunks are collected in a list and joined onto the unread bytes once, so that a
+    # record spanning many chunks is copied once rather than once per chunk. returns False if the
+    # stream ends first
+    def fill(self, size: int) -> bool:
+        chunks = [memoryview(self.data)[self.position:]]
+        available = self.available()
+        while available < size and not self.eof:
+            chunk = self.read(max(self.chunk_size, size - available))
+            if not chunk:
+                self.eof = True
+                break
+
+            chunks.append(chunk)
+            available += len(chunk)
+
+        if len(chunks) > 1:
+            self.data = b''.join(chunks)
+            self.position = 0
+
+        return available >= size
+
+    # take(length: int) -> bytes
+    #
+    # consumes and returns exactly 'length' bytes, reading as needed. returns fewer bytes only
+    # if the stream ends first
+    def take(self, length: int) -> bytes:
+        self.fill(length)
+
+        result = self.data[self.position : self.position + length]
+        self.position += len(result)
+        return result
+
+# iter_records(schema: schema, fileobj: object, framing: str = 'concatenated', chunk_size: int = 65536) -> generator
+#
+# reads records from a file-like object or socket and yields them one at a time. the stream is read
+# in chunks of chunk_size bytes, so memory use is bounded by the chunk size plus the largest record.
+#
+#   'concatenated':         records are written back to back with no framing
+#   'u32_length_prefixed':  each record is preceded by its length in bytes as a u32
+#
+def iter_records(schema: object, fileobj: object, framing: str = 'concatenated', chunk_size: int = 65536):
+    _check_framing(framing)
+    _codec = _get_codec(schema)
+    stream = _stream_buffer(fileobj, chunk_size)
+
+    if framing == 'u32_length_prefixed':
+        while True:
+            header = stream.take(4)
+            if not header:
+                return
+            elif len(header) < 4:
+                raise IndexError('out of data while reading record length')
+
+            length = _u32.unpack(header)[0]
+            _check_frame_length(_codec, length)
+
+            frame = stream.take(length)
+            if len(frame) < length:
+                raise IndexError('out of data while reading record of ' + str(length) + ' bytes')
+
+            yield _decode_frame(_codec, frame)
+
+    # with no framing, the only way to know that a record is complete is to decode it. when the
+    # buffer runs out part way through a record, read more and try again, but only once the buffer
+    # has at least doubled, so that a large record is decoded a logarithmic number of times rather
+    # than once per chunk
+    while True:
+        if stream.available() == 0 and not stream.fill(1):
+            return
+
+        try:
+            record, end = _deserialize_at(_codec, stream.data, stream.position)
+        except IndexError:
+            available = stream.available()
+            if not stream.fill(available + max(available, chunk_size)) and stream.available() == available:
+                raise
+            continue
+
+        if end == stream.position:
+            raise ValueError('cannot stream records of a schema that encodes to zero bytes')
+
+        stream.position = end
+        yield record
+
+# class RecordWriter
+#
+# writes records to a file-like object or socket using the same framings as iter_records(). records
+# are serialized into one internal buffer, which is only written out once it holds at least
+# buffer_size bytes, when flush() is called, or when the writer is closed. may be used as a context
+# manager, in which case it is closed on exit
+class RecordWriter:
+    _codec = None
+    _write = None
+    _framing = None
+    _buffer = None
+    buffer_size = None
+
+    def __init__(self, schema: object, fileobj: object, framing: str = 'concatenated', buffer_size: int = 65536):
+        _check_framing(framing)
+
+        # prefer sendall() for sockets, since send() may only write part of the data
+        self._write = getattr(fileobj, 'write', None) or getattr(fileobj, 'sendall', None)
+        if self._write is None:
+            raise TypeError('expected a file-like object or socket, not \'' + str(fileobj.__class__.__name__) + '\'')
+
+        self._codec = _get_codec(schema)
+        self._framing = framing
+        self._buffer = bytearray()
+        self.buffer_size = buffer_size
+
+    # write(record: dict) -> None
+    #
+    # serializes a record into the internal buffer, flushing it if it is full
+    def write(self, record: dict) -> None:
+        buffer = self._buffer
+        start = len(buffer)
+
+        try:
+            if self._framing == 'u32_length_prefixed':
+                # reserve space for the length and fill it in once the record has been written
+                buffer += b'\0\0\0\0'
+                _serialize_append(self._codec, record, buffer)
+                _u32.pack_into(buffer, start, len(buffer) - start - 4)
+            else:
+                _serialize_append(self._codec, record, buffer)
+        except BaseException:
+            # never leave a partial record behind in the buffer
+            del buffer[start:]
+            raise
+
+        if len(buffer) >= self.buffer_size:
+            self.flush()
+
+    # write_many(records: iterable) -> None
+    #
+    # writes every record from an iterable
+    def write_many(self, records: object) -> None:
+        for record in records:
+            self.write(record)
+
+    # flush() -> None
+    #
+    # writes out everything held in the internal buffer
+    def flush(self) -> None:
+        if self._buffer:
+            self._write(self._buffer)
+            self._buffer = bytearray()
+
+    def close(self) -> None:
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
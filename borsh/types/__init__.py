@@ -1,79 +1,222 @@
-from enum import auto, Enum, unique
+# _is_type(_type: object) -> bool
+#
+# returns True if the specified object is a Borsh type: one of the plain types in the 'types'
+# namespace, or an instance of one of its constructible types
+def _is_type(_type: object) -> bool:
+    try:
+        if _type in _plain_types:
+            return True
+    except TypeError:
+        # unhashable objects are never types
+        return False
+
+    return _type.__class__ in _constructible_types
+
+# class _named_type
+#
+# the internal class for the Borsh types that take no arguments, such as 'types.string'. each one is
+# a single shared instance that is compared with 'is', so pickling one returns that same instance
+# rather than a copy. not intended to be directly instantiated by user code
+class _named_type:
+    __slots__ = ('name',)
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __reduce__(self):
+        return (getattr, (types, self.name))
+
+    def __repr__(self):
+        return 'types.' + self.name
+
+# class _descriptor
+#
+# the internal base class for the constructible Borsh types. descriptors are immutable once they
+# are built, and two descriptors with the same arguments compare and hash as equal, so they can be
+# used as dict keys when caching compiled schemas. _fields lists the constructor arguments, in order
+class _descriptor:
+    __slots__ = ('_hash',)
+    _fields = ()
+
+    def _set(self, **values) -> None:
+        for name, value in values.items():
+            object.__setattr__(self, name, value)
+
+        object.__setattr__(self, '_hash', None)
+
+    def _values(self) -> tuple:
+        return tuple(getattr(self, name) for name in self._fields)
+
+    def __setattr__(self, name, value):
+        raise AttributeError('\'' + self.__class__.__name__.lstrip('_') + '\' objects are immutable')
+
+    def __delattr__(self, name):
+        raise AttributeError('\'' + self.__class__.__name__.lstrip('_') + '\' objects are immutable')
+
+    def __eq__(self, other):
+        if self is other:
+            return True
+        elif other.__class__ is not self.__class__:
+            return NotImplemented
+
+        return self._values() == other._values()
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        return result if result is NotImplemented else not result
+
+    def __hash__(self):
+        if self._hash is None:
+            object.__setattr__(self, '_hash', hash((self.__class__, self._values())))
+
+        return self._hash
+
+    def __reduce__(self):
+        return (self.__class__, self._values())
+
+    def __repr__(self):
+        return 'types.' + self.__class__.__name__.lstrip('_') + '(' + ', '.join(repr(value) for value in self._values()) + ')'
+
+# class _bytes
+#
+# the internal class representing a Borsh byte array: either a fixed length [u8; N] when a length
+# is given, or a u32 length-prefixed Vec<u8> when it is not. values are decoded into a single bytes
+# object, or a zero-copy memoryview into the source buffer when zero_copy is set. not intended to be
+# directly instantiated by user code; use 'types.bytes' instead
+class _bytes(_descriptor):
+    __slots__ = ('length', 'zero_copy')
+    _fields = ('length', 'zero_copy')
+
+    def __init__(self, length: int = None, zero_copy: bool = False):
+        if length is not None and (not isinstance(length, int) or isinstance(length, bool)):
+            length_class_name = length.__class__.__name__
+            raise TypeError('invalid type \'' + str(length_class_name) + '\' for bytes length (expected \'int\')')
+        elif length is not None and length < 0:
+            raise ValueError('invalid bytes length \'' + str(length) + '\' (expected a non-negative number of bytes)')
+
+        self._set(length=length, zero_copy=zero_copy)
 
 # class _dynamic_array
 #
 # the internal class representing a Borsh dynamic array. not intended to be directly instantiated
 # by user code; use 'types.dynamic_array' instead
-class _dynamic_array:
-    array_type = None
+class _dynamic_array(_descriptor):
+    __slots__ = ('array_type',)
+    _fields = ('array_type',)
 
     def __init__(self, _type):
-        self.array_type = _type
+        if not _is_type(_type):
+            raise ValueError('constructor for \'dynamic_array\' requires a borsh.types object as an argument')
+
+        self._set(array_type=_type)
 
 # class _fixed_array
 #
 # the internal class representing a Borsh fixed array. not intended to be directly instantiated
 # by user code; use 'types.fixed_array' instead
-class _fixed_array:
-    length = None
-    array_type = None
+class _fixed_array(_descriptor):
+    __slots__ = ('array_type', 'length')
+    _fields = ('array_type', 'length')
 
     def __init__(self, _type, length: int):
-        if not isinstance(length, int):
+        if not isinstance(length, int) or isinstance(length, bool):
             length_class_name = length.__class__.__name__
             raise TypeError('invalid type \'' + str(length_class_name) + '\' for fixed_array length (expected \'int\')')
+        elif length < 0:
+            raise ValueError('invalid fixed_array length \'' + str(length) + '\' (expected a non-negative number of items)')
+        elif not _is_type(_type):
+            raise ValueError('constructor for \'fixed_array\' requires a borsh.types object as its first argument')
 
-        self.length = length
-        self.array_type = _type
+        self._set(array_type=_type, length=length)
 
 # class _hashmap
 #
 # the internal class representing a Borsh hashmap. not intended to be directly instantiated
 # by user code; use 'types.hashmap' instead
-class _hashmap:
-    hashmap_key_type = None
-    hashmap_value_type = None
+class _hashmap(_descriptor):
+    __slots__ = ('hashmap_key_type', 'hashmap_value_type')
+    _fields = ('hashmap_key_type', 'hashmap_value_type')
 
     def __init__(self, hashmap_key_type, hashmap_value_type):
-        if not hashmap_key_type in vars(types).values() or not hashmap_value_type in vars(types).values() and \
-            not hashmap_key_type.__class__ in vars(types).values() or not hashmap_value_type.__class__ in vars(types).values():
+        if not _is_type(hashmap_key_type) or not _is_type(hashmap_value_type):
             raise ValueError('constructor for \'hashmap\' requires two borsh.types object as arguments')
-        
-        self.hashmap_key_type = hashmap_key_type
-        self.hashmap_value_type = hashmap_value_type
+
+        self._set(hashmap_key_type=hashmap_key_type, hashmap_value_type=hashmap_value_type)
 
 # class _hashset
 #
 # the internal class representing a Borsh hashset. not intended to be directly instantiated
 # by user code; use 'types.hashset' instead
-class _hashset:
-    hashset_type = None
+class _hashset(_descriptor):
+    __slots__ = ('hashset_type',)
+    _fields = ('hashset_type',)
 
     def __init__(self, hashset_type):
-        if not hashset_type in vars(types).values() and not hashset_type.__class__ in vars(types).values():
+        if not _is_type(hashset_type):
             raise ValueError('constructor for \'hashset\' requires a borsh.types object as an argument')
-        
-        self.hashset_type = hashset_type
+
+        self._set(hashset_type=hashset_type)
 
 # class _option
 #
 # the internal class representing a Borsh optional value. not intended to be directly instantiated
 # by user code; use 'types.option' instead
-class _option:
-    option_type = None
+class _option(_descriptor):
+    __slots__ = ('option_type',)
+    _fields = ('option_type',)
 
     def __init__(self, option_type):
-        if not option_type in vars(types).values() and not option_type.__class__ in vars(types).values():
+        if not _is_type(option_type):
             raise ValueError('constructor for \'option\' requires a borsh.types object as an argument')
-        
-        self.option_type = option_type
 
-# class _option
+        self._set(option_type=option_type)
+
+# class _enum
 #
-# the internal class representing a Borsh struct. not intended to be directly instantiated
-# by user code; use 'types.struct' instead
-class _struct:
-    struct_dict = None
+# the internal class representing a Borsh enum: a u8 tag selecting one of up to 256 variants,
+# followed by that variant's payload. variants are given as a dict of {name: payload type} in tag
+# order, or as a list of names and (name, payload type) pairs. unit variants may use 'types.unit' or
+# None as their payload. not intended to be directly instantiated by user code; use 'types.enum'
+# instead
+class _enum(_descriptor):
+    __slots__ = ('variants',)
+    _fields = ('variants',)
+
+    def __init__(self, variants):
+        if isinstance(variants, dict):
+            variants = list(variants.items())
+        elif not isinstance(variants, (list, tuple)):
+            raise TypeError('constructor for \'enum\' requires a dict or list of variants as an argument')
+
+        pairs = []
+        for variant in variants:
+            name, payload = (variant, None) if isinstance(variant, str) else variant
+            if not isinstance(name, str):
+                raise TypeError('invalid variant name \'' + str(name) + '\' for enum (expected \'str\')')
+            elif name in (pair[0] for pair in pairs):
+                raise ValueError('duplicate variant \'' + name + '\' in enum')
+
+            payload = types.unit if payload is None else payload
+            if not _is_type(payload):
+                raise ValueError('payload \'' + str(payload) + '\' of variant \'' + name + '\' is not a valid Borsh type')
+
+            pairs.append((name, payload))
+
+        if not 0 < len(pairs) <= 256:
+            raise ValueError('enum requires between 1 and 256 variants, received ' + str(len(pairs)))
+
+        self._set(variants=tuple(pairs))
+
+# class _struct
+#
+# the internal class representing a Borsh struct. it is also used to wrap the values of decoded
+# structs, so its dict is not validated here; schemas validate the structs that they contain. the
+# dict is copied, so that changing the caller's dict afterwards cannot change a struct, or its hash,
+# once it has been used as a type. not intended to be directly instantiated by user code; use
+# 'types.struct' instead
+class _struct(_descriptor):
+    __slots__ = ('struct_dict',)
+    _fields = ('struct_dict',)
 
     def __getitem__(self, index):
         return self.struct_dict[index]
@@ -82,7 +225,28 @@ class _struct:
         if not isinstance(struct_dict, dict):
             raise TypeError('constructor for \'struct\' requires a schema-like dict object as an argument')
 
-        self.struct_dict = struct_dict
+        self._set(struct_dict=dict(struct_dict))
+
+    # keys are encoded in order, so two structs with the same keys in a different order are
+    # different types. dict equality ignores the order, so the items are compared instead
+    def __eq__(self, other):
+        if self is other:
+            return True
+        elif other.__class__ is not _struct:
+            return NotImplemented
+
+        return tuple(self.struct_dict.items()) == tuple(other.struct_dict.items())
+
+    def __hash__(self):
+        # decoded structs are built by _wrap_struct(), which leaves the cached hash unset
+        try:
+            if self._hash is not None:
+                return self._hash
+        except AttributeError:
+            pass
+
+        object.__setattr__(self, '_hash', hash((_struct, tuple(self.struct_dict.items()))))
+        return self._hash
 
     def __repr__(self):
         return str(self.struct_dict)
@@ -90,6 +254,16 @@ class _struct:
     def __str__(self):
         return self.__repr__()
 
+# _wrap_struct(struct_dict: dict) -> _struct
+#
+# wraps a decoded dict in a struct without going through the checks in the constructor, since the
+# decoders build one of these for every struct value
+def _wrap_struct(struct_dict: dict, _new=object.__new__, _set=_struct.struct_dict.__set__) -> _struct:
+    wrapped = _new(_struct)
+    _set(wrapped, struct_dict)
+
+    return wrapped
+
 # class types
 #
 # 'types' is essentially a namespace for all of the different Borsh types. it was originally an enum
@@ -119,22 +293,25 @@ class types:
     f64 = 8 + float_offset
 
     # unit type
-    unit = auto()
+    unit = _named_type('unit')
 
     # array types
     fixed_array = _fixed_array
     dynamic_array = _dynamic_array
 
+    # byte array type
+    bytes = _bytes
+
     # struct type
     struct = _struct
 
     # field types
-    fields = auto()
-    named_fields = auto()
-    unnamed_fields = auto()
+    fields = _named_type('fields')
+    named_fields = _named_type('named_fields')
+    unnamed_fields = _named_type('unnamed_fields')
 
     # enum type
-    enum = auto()
+    enum = _enum
 
     # hash types
     hashmap = _hashmap
@@ -144,7 +321,7 @@ class types:
     option = _option
 
     # string type
-    string = auto()
+    string = _named_type('string')
 
 # class type_groups
 #
@@ -174,3 +351,8 @@ class type_groups:
         types.u64,
         types.u128
     ]
+
+# the plain types and the classes of the constructible types, used by _is_type()
+_plain_types = frozenset(value for name, value in vars(types).items()
+    if not name.startswith('_') and (isinstance(value, int) or isinstance(value, _named_type)))
+_constructible_types = frozenset((_bytes, _dynamic_array, _enum, _fixed_array, _hashmap, _hashset, _option, _struct))
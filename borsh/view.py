@@ -0,0 +1,113 @@
+import struct   # error
+from collections.abc import Mapping
+from . import _get_codec, _as_buffer
+
+# class lazy
+#
+# a read-only, dict-like view of a record that only decodes a key when it is first accessed. the
+# offsets of keys in the fixed-size prefix of the record are known up front. past the first
+# variable-length key, offsets are found incrementally by skipping over the keys in between
+# without decoding them. decoded values are cached on the view
+class lazy(Mapping):
+    __slots__ = ('_layout', '_index', '_data', '_offset', '_positions', '_values', '_max_total_bytes')
+
+    def __init__(self, schema: object, buffer: object, offset: int = 0):
+        if not isinstance(offset, int) or offset < 0:
+            raise ValueError('invalid offset \'' + str(offset) + '\' for lazy()')
+
+        _codec = _get_codec(schema)
+        self._layout = _codec.layout()
+        self._index = _codec.key_index
+        self._data = _as_buffer(buffer, 'lazy')
+        self._offset = offset
+        self._max_total_bytes = None
+
+        # as for every other way of decoding, reading stops at max_total_bytes past the offset
+        if _codec.max_total_bytes is not None and len(self._data) - offset > _codec.max_total_bytes:
+            self._data = memoryview(self._data)[: offset + _codec.max_total_bytes]
+            self._max_total_bytes = _codec.max_total_bytes
+
+        # the known absolute position of every key, or None where it has not been found yet
+        self._positions = [offset + field_offset if field_offset is not None else None
+            for key, field_offset, decode_value, skip_value in self._layout]
+        self._values = {}
+
+    # _out_of_data(key: str) -> Exception
+    #
+    # returns the error to raise when a key runs past the end of the data: a ValueError if the data
+    # was cut short at max_total_bytes, and an IndexError otherwise
+    def _out_of_data(self, key: str) -> Exception:
+        if self._max_total_bytes is not None:
+            return ValueError('record is over max_total_bytes (' + str(self._max_total_bytes) + ')')
+
+        return IndexError('out of data while reading value for key \'' + str(key) + '\'')
+
+    # _position(index: int) -> int
+    #
+    # returns the position of the key at the specified index, skipping forward from the closest
+    # known position before it
+    def _position(self, index: int) -> int:
+        positions = self._positions
+        if positions[index] is not None:
+            return positions[index]
+
+        known = index
+        while positions[known] is None:
+            known -= 1
+
+        data = self._data
+        for n in range(known, index):
+            key = self._layout[n][0]
+            try:
+                positions[n + 1] = self._layout[n][3](data, positions[n])
+            except (IndexError, struct.error):
+                raise self._out_of_data(key)
+
+        return positions[index]
+
+    def __getitem__(self, key):
+        try:
+            return self._values[key]
+        except KeyError:
+            pass
+
+        index = self._index[key]
+        position = self._position(index)
+
+        try:
+            value, end = self._layout[index][2](self._data, position)
+        except (IndexError, struct.error):
+            raise self._out_of_data(key)
+
+        # the end of this key is the position of the next one
+        if index + 1 < len(self._positions):
+            self._positions[index + 1] = end
+
+        self._values[key] = value
+        return value
+
+    def __iter__(self):
+        return iter(self._index)
+
+    def __len__(self):
+        return len(self._index)
+
+    def __contains__(self, key):
+        return key in self._index
+
+    # end() -> int
+    #
+    # returns the offset just past the end of the record, skipping over any keys that have not
+    # been read yet
+    def end(self) -> int:
+        if not self._layout:
+            return self._offset
+
+        last = len(self._layout) - 1
+        try:
+            return self._layout[last][3](self._data, self._position(last))
+        except (IndexError, struct.error):
+            raise self._out_of_data(self._layout[last][0])
+
+    def __repr__(self):
+        return 'lazy(' + ', '.join(repr(key) for key in self._index) + ')'
@@ -11,18 +11,22 @@ setup(
   url = 'https://github.com/whdev1/borsh-python',
   download_url = 'https://github.com/whdev1/libborsh-py/archive/refs/tags/v0.1.3.tar.gz',
   keywords = ['Borsh', 'Binary', 'Stream'],
+  python_requires='>=3.8',
   install_requires=[],
+  extras_require={
+    'numpy': ['numpy'],
+  },
   classifiers=[
     'Development Status :: 3 - Alpha',
     'Intended Audience :: Developers',
     'Topic :: Software Development :: Build Tools',
     'License :: OSI Approved :: MIT License',
     'Programming Language :: Python :: 3',
-    'Programming Language :: Python :: 3.4',
-    'Programming Language :: Python :: 3.5',
-    'Programming Language :: Python :: 3.6',
-    'Programming Language :: Python :: 3.7',
     'Programming Language :: Python :: 3.8',
     'Programming Language :: Python :: 3.9',
+    'Programming Language :: Python :: 3.10',
+    'Programming Language :: Python :: 3.11',
+    'Programming Language :: Python :: 3.12',
+    'Programming Language :: Python :: 3.13',
   ],
 )
\ No newline at end of file
@@ -0,0 +1,54 @@
+import concurrent.futures   # ThreadPoolExecutor
+import os                   # path
+import sys                  # path
+import unittest             # TestCase
+
+# the checks are shared with benchmarks/threads.py, which also reports how throughput scales
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks'))
+
+import borsh
+import threads
+
+# the number of threads to run at once. more threads than CPUs still interleave on builds with the
+# GIL, and run in parallel on free-threaded builds
+_threads = 8
+
+class ThreadSafetyTest(unittest.TestCase):
+    # every benchmark case is encoded and decoded on many threads with shared schemas, and every
+    # result must match the single-threaded one
+    def test_shared_schemas(self):
+        threads.stress(_threads, 3)
+
+    # string intern tables, CachedDecoders and serialize_many() are shared at run time
+    def test_shared_state(self):
+        threads.stress_shared_state(_threads, 5000)
+
+    # far more distinct strings than the intern table holds, so that threads evict each other's
+    # entries while they are being looked up
+    def test_string_table_eviction(self):
+        _schema = borsh.schema({'name': borsh.types.string}, intern_strings=16)
+        items = [{'name': 'name' + str(n % 997)} for n in range(20000)]
+        encoded = [borsh.serialize(_schema, item) for item in items]
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=_threads) as executor:
+            decoded = list(executor.map(lambda data: borsh.deserialize(_schema, data), encoded, chunksize=64))
+
+        self.assertEqual(decoded, items)
+        self.assertLessEqual(len(_schema.compile().strings.strings), 16)
+
+    # a cache much smaller than the set of payloads, so that hits and evictions race
+    def test_cached_decoder_eviction(self):
+        _schema = borsh.schema({'price': borsh.types.u64})
+        items = [{'price': n % 101} for n in range(20000)]
+        encoded = [borsh.serialize(_schema, item) for item in items]
+        decoder = borsh.CachedDecoder(_schema, maxsize=8)
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=_threads) as executor:
+            decoded = list(executor.map(decoder, encoded, chunksize=64))
+
+        self.assertEqual([dict(value) for value in decoded], items)
+        self.assertLessEqual(len(decoder), 8)
+        self.assertEqual(decoder.nbytes, sum(len(key) for key in decoder._values))
+
+if __name__ == '__main__':
+    unittest.main()